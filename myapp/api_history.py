@@ -0,0 +1,103 @@
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .writers import insert_rows
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLUMNS = ['api_id', 'call', 'ip', 'date_added']
+
+
+class ApiHistoryRecorder:
+    """
+    Buffers API calls in memory and writes them to oc_api_history in batches.
+
+    Calls are appended to a ring buffer of at most `capacity` entries; when
+    it is full the oldest entry is overwritten and counted as dropped, so
+    memory stays bounded however far the database falls behind. A background
+    thread flushes the buffer with multi-row INSERTs every `interval` seconds,
+    or as soon as `batch_size` calls are waiting.
+    """
+
+    def __init__(self, capacity=None, batch_size=None, interval=None):
+        self.capacity = capacity or getattr(settings, 'OPENCART_API_HISTORY_BUFFER', 10000)
+        self.batch_size = batch_size or getattr(settings, 'OPENCART_API_HISTORY_BATCH', 500)
+        self.interval = interval or getattr(settings, 'OPENCART_API_HISTORY_FLUSH_INTERVAL', 1.0)
+        self._buffer = deque(maxlen=self.capacity)
+        self._condition = threading.Condition()
+        self._worker = None
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+
+    def record(self, api_id, call, ip):
+        with self._condition:
+            if len(self._buffer) == self.capacity:
+                self._stats['dropped'] += 1
+            self._buffer.append((api_id, call[:32], ip, timezone.now()))
+            self._stats['recorded'] += 1
+            if getattr(settings, 'OPENCART_API_HISTORY', 'async') == 'async':
+                self._ensure_worker()
+                if len(self._buffer) >= self.batch_size:
+                    self._condition.notify()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='opencart-api-history', daemon=True)
+            self._worker.start()
+
+    def _take(self):
+        with self._condition:
+            entries = list(self._buffer)
+            self._buffer.clear()
+        return entries
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._buffer) >= self.batch_size, timeout=self.interval)
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def flush(self):
+        """Write everything buffered right away, in the calling thread."""
+        entries = self._take()
+        if not entries:
+            return 0
+        rows = [
+            [api_id, call, ip, connection.ops.adapt_datetimefield_value(date_added)]
+            for api_id, call, ip, date_added in entries
+        ]
+        try:
+            with connection.cursor() as cursor:
+                insert_rows(cursor, 'oc_api_history', HISTORY_COLUMNS, rows, self.batch_size)
+        except Exception as e:
+            # History is best effort: count the loss instead of retrying forever
+            logger.error(f"Failed to write {len(rows)} API history rows: {str(e)}")
+            with self._condition:
+                self._stats['failed'] += len(rows)
+            return 0
+        with self._condition:
+            self._stats['written'] += len(rows)
+        return len(rows)
+
+    def stats(self):
+        with self._condition:
+            return dict(self._stats, pending=len(self._buffer), capacity=self.capacity)
+
+
+api_history_recorder = ApiHistoryRecorder()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        api_history_recorder.flush()
+    except Exception:
+        pass
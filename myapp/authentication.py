@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import Api, ApiIp, Customer
+
+# Customer columns kept for each cached token, in CustomerUser argument order
+CUSTOMER_COLUMNS = ('customer_id', 'customer_group_id', 'store_id', 'email', 'firstname', 'lastname')
+
+
+class CustomerUser:
+    """The customer behind an API token, as seen on `request.user`."""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, customer_id, customer_group_id, store_id, email, firstname, lastname):
+        self.customer_id = customer_id
+        self.customer_group_id = customer_group_id
+        self.store_id = store_id
+        self.email = email
+        self.firstname = firstname
+        self.lastname = lastname
+
+    @property
+    def pk(self):
+        return self.customer_id
+
+    id = pk
+
+    def __str__(self):
+        return self.email
+
+
+class ApiKeyUser:
+    """The API client behind an `X-Api-Key`, as seen on `request.user`."""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, api_id, username):
+        self.api_id = api_id
+        self.username = username
+
+    @property
+    def pk(self):
+        return self.api_id
+
+    id = pk
+
+    def __str__(self):
+        return self.username
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of token -> row values with a time to live.
+
+    The first value is the id of the token's owner (a customer or an API
+    client). Entries are local to the process. Logins, logouts and owner
+    changes drop them here immediately; other processes keep serving a
+    revoked token until its entry expires, so `OPENCART_TOKEN_CACHE_TTL`
+    bounds how long that can last.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def maxsize(self):
+        return getattr(settings, 'OPENCART_TOKEN_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'OPENCART_TOKEN_CACHE_TTL', 60)
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires <= time.monotonic():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return values
+
+    def set(self, token, values):
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def discard_owner(self, owner_id):
+        with self._lock:
+            for token in [t for t, (_, values) in self._entries.items() if values[0] == owner_id]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+api_key_cache = TokenCache()
+
+
+def invalidate_customer_tokens(customer_id):
+    """Forget the cached tokens of a customer once the current transaction commits."""
+    transaction.on_commit(lambda: token_cache.discard_owner(customer_id))
+
+
+def invalidate_api_keys(api_id):
+    """Forget the cached key of an API client once the current transaction commits."""
+    transaction.on_commit(lambda: api_key_cache.discard_owner(api_id))
+
+
+class CustomerTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates `Authorization: Token <token>` against oc_customer.token.
+
+    Resolved tokens are kept in `token_cache`, so only the first request
+    with a token (or the first after it expires) queries oc_customer.
+    """
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+
+        values = token_cache.get(token)
+        if values is None:
+            values = (
+                Customer.objects
+                .filter(token=token, status=1)
+                .values_list(*CUSTOMER_COLUMNS)
+                .first()
+            )
+            if values is None:
+                raise exceptions.AuthenticationFailed("Invalid token.")
+            token_cache.set(token, values)
+
+        return CustomerUser(*values), token
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class ApiKeyAuthentication(BaseAuthentication):
+    """
+    Authenticates `X-Api-Key: <key>` against the enabled clients in oc_api.
+
+    As in OpenCart, a client with rows in oc_api_ip is only accepted from
+    those addresses. Resolved keys are cached in `api_key_cache`.
+    """
+    header = 'HTTP_X_API_KEY'
+
+    def authenticate(self, request):
+        key = request.META.get(self.header)
+        if not key:
+            return None
+
+        values = api_key_cache.get(key)
+        if values is None:
+            api = Api.objects.filter(key=key, status=1).values_list('api_id', 'username').first()
+            if api is None:
+                raise exceptions.AuthenticationFailed("Invalid API key.")
+            allowed_ips = frozenset(ApiIp.objects.filter(api_id=api[0]).values_list('ip', flat=True))
+            values = api + (allowed_ips,)
+            api_key_cache.set(key, values)
+
+        api_id, username, allowed_ips = values
+        if allowed_ips and request.META.get('REMOTE_ADDR') not in allowed_ips:
+            raise exceptions.AuthenticationFailed("API key not allowed from this address.")
+        return ApiKeyUser(api_id, username), key
@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .schema import table_exists
+
+logger = logging.getLogger(__name__)
+
+STORAGE_CACHE_DIRS = [
+    'system/storage/cache/',
+    'system/storage/modification/',
+    'image/cache/',
+]
+
+ADMIN_CACHE_DIRS = [
+    'admin/storage/cache/',
+    'admin/storage/modification/',
+]
+
+TEMPLATE_CACHE_DIRS = [
+    f'catalog/view/theme/default/template/{section}/'
+    for section in (
+        'product', 'category', 'common', 'checkout', 'account', 'error',
+        'information', 'module', 'payment', 'shipping', 'total'
+    )
+]
+
+# What each cache tag purges: oc_cache key prefixes, oc_modification code
+# prefixes, whole tables to empty and storage directories to clear.
+CACHE_TAGS = {
+    'product': {
+        'cache_keys': ['product'],
+        'modification_codes': ['product'],
+        'tables': ['oc_product_image_cache'],
+    },
+    'category': {
+        'cache_keys': ['category'],
+        'modification_codes': ['category'],
+        'tables': ['oc_category_image_cache'],
+    },
+    'manufacturer': {'cache_keys': ['manufacturer']},
+    'information': {'cache_keys': ['information']},
+    'menu': {'cache_keys': ['menu'], 'modification_codes': ['menu']},
+    'store': {'cache_keys': ['store'], 'modification_codes': ['store']},
+    'admin': {'cache_keys': ['admin'], 'modification_codes': ['admin'], 'directories': ADMIN_CACHE_DIRS},
+    'layout': {'cache_keys': ['layout'], 'modification_codes': ['layout']},
+    'theme': {'cache_keys': ['theme', 'template'], 'modification_codes': ['theme'], 'directories': TEMPLATE_CACHE_DIRS},
+    'storage': {'directories': STORAGE_CACHE_DIRS},
+}
+
+PRODUCT_WRITE_TAGS = ('product', 'category', 'manufacturer', 'information', 'menu', 'store', 'admin', 'storage')
+PRODUCT_DELETE_TAGS = PRODUCT_WRITE_TAGS + ('layout', 'theme')
+CATEGORY_WRITE_TAGS = ('category', 'menu', 'storage')
+
+
+def _clear_directory(cache_dir):
+    try:
+        if not os.path.exists(cache_dir):
+            return
+        for file in os.listdir(cache_dir):
+            file_path = os.path.join(cache_dir, file)
+            try:
+                if os.path.isfile(file_path):
+                    os.unlink(file_path)
+            except Exception as e:
+                logger.warning(f"Error clearing cache file {file_path}: {str(e)}")
+    except Exception as e:
+        logger.warning(f"Error accessing cache directory {cache_dir}: {str(e)}")
+
+
+def purge_tags(tags):
+    """
+    Run the OpenCart cache purge for a set of tags.
+
+    Each key prefix, modification code, table and directory is purged once
+    however many tags reference it, and config_modification is bumped once
+    per call.
+    """
+    tags = [tag for tag in tags if tag in CACHE_TAGS]
+    if not tags:
+        return
+
+    cache_keys, modification_codes, tables, directories = [], [], [], []
+    for tag in tags:
+        spec = CACHE_TAGS[tag]
+        cache_keys.extend(spec.get('cache_keys', []))
+        modification_codes.extend(spec.get('modification_codes', []))
+        tables.extend(spec.get('tables', []))
+        directories.extend(spec.get('directories', []))
+
+    try:
+        with connection.cursor() as cursor:
+            if cache_keys and table_exists('oc_cache'):
+                for prefix in dict.fromkeys(cache_keys):
+                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE %s", [f'{prefix}%'])
+
+            if modification_codes and table_exists('oc_modification'):
+                for prefix in dict.fromkeys(modification_codes):
+                    cursor.execute("DELETE FROM oc_modification WHERE code LIKE %s", [f'{prefix}%'])
+
+            for table in dict.fromkeys(tables):
+                if table_exists(table):
+                    cursor.execute(f"DELETE FROM {table}")
+
+            if table_exists('oc_setting'):
+                cursor.execute("UPDATE oc_setting SET value = NOW() WHERE `key` = 'config_modification'")
+    except Exception as e:
+        # Cache purging is not critical; the data itself is already committed
+        logger.error(f"Error clearing cache for tags {tags}: {str(e)}")
+
+    for cache_dir in dict.fromkeys(directories):
+        _clear_directory(cache_dir)
+
+    logger.info(f"OpenCart cache cleared for tags: {', '.join(sorted(tags))}")
+
+
+class InvalidationQueue:
+    """
+    Collects cache tags from committed transactions and purges them in the
+    background.
+
+    Tags arriving within `window` seconds of each other are coalesced, so a
+    burst of writes (a bulk import, say) results in one purge per tag rather
+    than one purge per write.
+    """
+
+    def __init__(self, window=None):
+        self.window = window
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def get_window(self):
+        if self.window is not None:
+            return self.window
+        return getattr(settings, 'OPENCART_CACHE_INVALIDATION_WINDOW', 2.0)
+
+    def enqueue(self, tags):
+        with self._condition:
+            self._pending.update(tags)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='opencart-cache-invalidation', daemon=True
+                )
+                self._worker.start()
+            self._condition.notify()
+
+    def _take_pending(self):
+        with self._condition:
+            tags, self._pending = self._pending, set()
+        return tags
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+            # Let further tags accumulate before purging
+            time.sleep(self.get_window())
+            try:
+                purge_tags(self._take_pending())
+            finally:
+                connection.close()
+
+    def flush(self):
+        """Purge everything pending right away, in the calling thread."""
+        purge_tags(self._take_pending())
+
+
+invalidation_queue = InvalidationQueue()
+
+
+def invalidate_cache_tags(*tags):
+    """
+    Schedule an OpenCart cache purge for `tags` once the current transaction
+    commits. Nothing is purged if it rolls back.
+
+    With OPENCART_CACHE_INVALIDATION = 'sync' the purge runs inline right
+    after commit instead of on the background worker.
+    """
+    if getattr(settings, 'OPENCART_CACHE_INVALIDATION', 'async') == 'sync':
+        transaction.on_commit(lambda: purge_tags(tags))
+    else:
+        transaction.on_commit(lambda: invalidation_queue.enqueue(tags))
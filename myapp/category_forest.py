@@ -0,0 +1,353 @@
+from collections import defaultdict, deque
+
+from django.db import connection
+from django.utils import timezone
+
+from .descriptions import CATEGORY_DESCRIPTIONS, write_descriptions
+from .product_cache import invalidate_products
+from .schema import table_exists
+from .writers import insert_returning_ids, insert_rows
+
+CATEGORY_COLUMNS = [
+    'image', 'parent_id', 'column', 'sort_order', 'status', 'date_added', 'date_modified'
+]
+
+
+class ForestError(ValueError):
+    """A forest that cannot be written; `errors` lists the offending nodes."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid categories")
+        self.errors = errors
+
+
+def node_error(key, message):
+    return {'key': key, 'errors': {'non_field_errors': [message]}}
+
+
+def flatten_forest(nodes):
+    """
+    Flatten nested `children` lists into nodes referencing their parent by
+    `parent_key`, parents first.
+
+    Keys are the client's `key` values as strings; nodes without one are
+    keyed by their position ("0", "0.2", ...).
+    """
+    if not isinstance(nodes, list):
+        raise ForestError([node_error(None, "Expected a list of categories")])
+
+    flat = []
+    stack = [(None, str(index), node) for index, node in reversed(list(enumerate(nodes)))]
+    while stack:
+        parent_key, default_key, node = stack.pop()
+        if not isinstance(node, dict):
+            raise ForestError([node_error(default_key, "Expected a category object")])
+        node = dict(node)
+        children = node.pop('children', None) or []
+        if not isinstance(children, list):
+            raise ForestError([node_error(default_key, "children must be a list")])
+
+        node['key'] = str(node.get('key', default_key))
+        if parent_key is not None:
+            node['parent_key'] = parent_key
+        elif node.get('parent_key') is not None:
+            node['parent_key'] = str(node['parent_key'])
+        flat.append(node)
+        stack.extend(
+            (node['key'], f"{node['key']}.{index}", child)
+            for index, child in reversed(list(enumerate(children)))
+        )
+    return flat
+
+
+def order_forest(nodes):
+    """
+    Order flattened nodes so that every parent precedes its children.
+
+    A breadth-first walk from the nodes without a `parent_key`; whatever it
+    does not reach sits on a cycle. Raises ForestError for duplicate keys,
+    unknown parent keys, conflicting parents and cycles.
+    """
+    errors = []
+    by_key = {}
+    for node in nodes:
+        if node['key'] in by_key:
+            errors.append(node_error(node['key'], "Duplicate key"))
+        by_key[node['key']] = node
+
+    roots = []
+    children = defaultdict(list)
+    for key, node in by_key.items():
+        parent_key = node.get('parent_key')
+        if parent_key is None:
+            roots.append(node)
+        elif node.get('parent_id'):
+            errors.append(node_error(key, "Give either parent_key or parent_id, not both"))
+        elif parent_key not in by_key:
+            errors.append(node_error(key, f"Unknown parent key '{parent_key}'"))
+        else:
+            children[parent_key].append(node)
+    if errors:
+        raise ForestError(errors)
+
+    ordered = []
+    queue = deque(roots)
+    while queue:
+        node = queue.popleft()
+        ordered.append(node)
+        queue.extend(children[node['key']])
+
+    if len(ordered) < len(by_key):
+        reached = {node['key'] for node in ordered}
+        raise ForestError([
+            node_error(key, "Parent references form a cycle") for key in by_key if key not in reached
+        ])
+    return ordered
+
+
+def write_category_forest(cursor, nodes, chunk_size=None):
+    """
+    Insert categories and all their rows with multi-row INSERTs.
+
+    `nodes` are (key, parent_key, data) triples ordered parents first, where
+    `data` is validated CategorySerializer data and `parent_key` is the key
+    of another node or None (then `data['parent_id']`, an existing category,
+    or a root). The paths of existing parents are read and share-locked in
+    the transaction. oc_category is inserted one depth at a time to take
+    ids from AUTO_INCREMENT, after which every oc_category_path row is
+    computed in memory from the parent's path. Must run inside a
+    transaction. Returns {key: category_id}.
+    """
+    external_parents = {
+        data['parent_id'] for _, parent_key, data in nodes if parent_key is None and data.get('parent_id')
+    }
+    parent_paths = defaultdict(list)
+    if external_parents:
+        placeholders = ', '.join(['%s'] * len(external_parents))
+        cursor.execute(f"""
+            SELECT category_id, path_id, level FROM oc_category_path
+            WHERE category_id IN ({placeholders})
+            ORDER BY category_id, level
+            LOCK IN SHARE MODE
+        """, list(external_parents))
+        for category_id, path_id, level in cursor.fetchall():
+            parent_paths[category_id].append((path_id, level))
+
+    missing = [parent_id for parent_id in external_parents if parent_id not in parent_paths]
+    if missing:
+        raise ForestError([
+            node_error(key, f"Parent category {data['parent_id']} does not exist")
+            for key, parent_key, data in nodes if parent_key is None and data.get('parent_id') in missing
+        ])
+
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    # One INSERT per depth, so every row's parent already has its id
+    depths = {}
+    levels = defaultdict(list)
+    for key, parent_key, data in nodes:
+        depths[key] = depths[parent_key] + 1 if parent_key is not None else 0
+        levels[depths[key]].append((key, parent_key, data))
+
+    category_ids, parent_ids = {}, {}
+    for depth in sorted(levels):
+        category_rows = []
+        for key, parent_key, data in levels[depth]:
+            parent_ids[key] = category_ids[parent_key] if parent_key is not None else data.get('parent_id') or 0
+            category_rows.append([
+                data.get('image', ''),
+                parent_ids[key],
+                data.get('column', 1),
+                data.get('sort_order', 0),
+                data.get('status', 1),
+                now,
+                now
+            ])
+        ids = insert_returning_ids(cursor, 'oc_category', CATEGORY_COLUMNS, category_rows, chunk_size)
+        category_ids.update(zip((key for key, _, _ in levels[depth]), ids))
+
+    paths = {}
+    descriptions, path_rows = [], []
+    filter_rows, layout_rows, store_rows, coupon_rows = [], [], [], []
+    for key, parent_key, data in nodes:
+        category_id = category_ids[key]
+        if parent_key is not None:
+            parent_path = paths[parent_key]
+        else:
+            parent_path = parent_paths[parent_ids[key]] if parent_ids[key] else []
+        paths[key] = parent_path + [(category_id, len(parent_path) + 1)]
+        path_rows.extend([category_id, path_id, level] for path_id, level in paths[key])
+
+        description = {column: data.get(column, '') for column in CATEGORY_DESCRIPTIONS.columns}
+        description['language_id'] = data.get('language_id', 1)
+        descriptions.append((category_id, [description]))
+
+        filter_rows.extend([category_id, item['filter_id']] for item in data.get('filters', []))
+        layout_rows.extend(
+            [category_id, item['store_id'], item.get('layout_id', 0)] for item in data.get('layouts', [])
+        )
+        store_rows.extend([category_id, item['store_id']] for item in data.get('stores', []))
+        coupon_rows.extend([category_id, item['coupon_id']] for item in data.get('coupons', []))
+
+    write_descriptions(cursor, CATEGORY_DESCRIPTIONS, descriptions, chunk_size=chunk_size)
+    insert_rows(cursor, 'oc_category_path', ['category_id', 'path_id', 'level'], path_rows, chunk_size)
+    insert_rows(cursor, 'oc_category_filter', ['category_id', 'filter_id'], filter_rows, chunk_size)
+    insert_rows(cursor, 'oc_category_to_layout', ['category_id', 'store_id', 'layout_id'], layout_rows, chunk_size)
+    insert_rows(cursor, 'oc_category_to_store', ['category_id', 'store_id'], store_rows, chunk_size)
+    insert_rows(cursor, 'oc_coupon_category', ['category_id', 'coupon_id'], coupon_rows, chunk_size)
+    return category_ids
+
+
+# Rows hanging off a category, removed together with it
+CATEGORY_CHILD_TABLES = [
+    'oc_category_description', 'oc_category_filter', 'oc_category_to_store',
+    'oc_category_to_layout', 'oc_coupon_category', 'oc_product_to_category',
+]
+
+
+def category_path(cursor, category_id):
+    """{path_id: level} of `category_id` as stored in oc_category_path."""
+    cursor.execute("SELECT path_id, level FROM oc_category_path WHERE category_id = %s", [category_id])
+    return dict(cursor.fetchall())
+
+
+def subtree_product_ids(cursor, category_id):
+    """Ids of the products assigned to `category_id` or any category below it."""
+    if not table_exists('oc_product_to_category'):
+        return []
+    cursor.execute("""
+        SELECT DISTINCT p2c.product_id
+        FROM oc_product_to_category p2c
+        JOIN oc_category_path sub ON sub.category_id = p2c.category_id
+        WHERE sub.path_id = %s
+    """, [category_id])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def delete_category_subtree(cursor, category_id):
+    """
+    Delete `category_id`, every category below it and all their rows.
+
+    The subtree is whatever oc_category_path lists under `category_id`, so
+    each table is cleared with one `DELETE ... JOIN` however large the
+    subtree is. Cached payloads of the affected products are dropped on
+    commit. Must run inside a transaction. Returns the deleted row count per
+    table.
+    """
+    # Categories written without their own path row are still covered
+    cursor.execute(
+        "INSERT IGNORE INTO oc_category_path (category_id, path_id, level) VALUES (%s, %s, 0)",
+        [category_id, category_id]
+    )
+
+    invalidate_products(subtree_product_ids(cursor, category_id))
+
+    deleted = {}
+    for table in CATEGORY_CHILD_TABLES + ['oc_category']:
+        if not table_exists(table):
+            continue
+        cursor.execute(f"""
+            DELETE t FROM {table} t
+            JOIN oc_category_path sub ON sub.category_id = t.category_id
+            WHERE sub.path_id = %s
+        """, [category_id])
+        deleted[table] = cursor.rowcount
+
+    cursor.execute("""
+        DELETE p FROM oc_category_path p
+        JOIN oc_category_path sub ON sub.category_id = p.category_id
+        WHERE sub.path_id = %s
+    """, [category_id])
+    deleted['oc_category_path'] = cursor.rowcount
+    return deleted
+
+
+def move_category_subtree(cursor, category_id, parent_id):
+    """
+    Re-parent `category_id` and rewrite oc_category_path for its subtree.
+
+    The old ancestors are cut from every path in the subtree, the remaining
+    levels shifted and the new parent's path attached, each with a single
+    set-based statement. Products in the subtree lose their links to the
+    old ancestors (unless a category outside the subtree still implies
+    one), are linked to the new ancestors as they are on create and their
+    cached payloads dropped. Raises ForestError when the category or parent
+    does not exist or the parent lies inside the subtree.
+    """
+    path = category_path(cursor, category_id)
+    if category_id not in path:
+        raise ForestError([node_error(category_id, f"Category {category_id} not found")])
+
+    parent_path = category_path(cursor, parent_id) if parent_id else {}
+    if parent_id and parent_id not in parent_path:
+        raise ForestError([node_error(category_id, f"Parent category {parent_id} does not exist")])
+    if category_id in parent_path:
+        raise ForestError([node_error(category_id, "A category cannot be moved below itself")])
+
+    old_ancestors = [path_id for path_id in path if path_id != category_id]
+    new_level = parent_path[parent_id] + 1 if parent_id else min(path.values())
+    shift = new_level - path[category_id]
+
+    if old_ancestors:
+        placeholders = ', '.join(['%s'] * len(old_ancestors))
+        cursor.execute(f"""
+            DELETE p FROM oc_category_path p
+            JOIN oc_category_path sub ON sub.category_id = p.category_id
+            WHERE sub.path_id = %s AND p.path_id IN ({placeholders})
+        """, [category_id] + old_ancestors)
+
+    if shift:
+        cursor.execute("""
+            UPDATE oc_category_path p
+            JOIN oc_category_path sub ON sub.category_id = p.category_id
+            SET p.level = p.level + %s
+            WHERE sub.path_id = %s
+        """, [shift, category_id])
+
+    invalidate_products(subtree_product_ids(cursor, category_id))
+
+    if old_ancestors and table_exists('oc_product_to_category'):
+        # Unlink subtree products from the old ancestors, except where another
+        # of their categories outside the subtree still lies below one. The
+        # DISTINCT derived tables are materialized, which MySQL requires to
+        # read the table a DELETE writes.
+        cursor.execute(f"""
+            DELETE p2c FROM oc_product_to_category p2c
+            JOIN (
+                SELECT DISTINCT moved.product_id
+                FROM oc_product_to_category moved
+                JOIN oc_category_path sub ON sub.category_id = moved.category_id AND sub.path_id = %s
+            ) moved ON moved.product_id = p2c.product_id
+            LEFT JOIN (
+                SELECT DISTINCT other.product_id, anc.path_id
+                FROM oc_product_to_category other
+                JOIN oc_category_path anc ON anc.category_id = other.category_id
+                LEFT JOIN oc_category_path inside
+                    ON inside.category_id = other.category_id AND inside.path_id = %s
+                WHERE inside.category_id IS NULL AND anc.path_id <> other.category_id
+            ) kept ON kept.product_id = p2c.product_id AND kept.path_id = p2c.category_id
+            WHERE p2c.category_id IN ({placeholders}) AND kept.product_id IS NULL
+        """, [category_id, category_id] + old_ancestors)
+
+    if parent_id:
+        cursor.execute("""
+            INSERT INTO oc_category_path (category_id, path_id, level)
+            SELECT sub.category_id, anc.path_id, anc.level
+            FROM oc_category_path sub
+            JOIN oc_category_path anc ON anc.category_id = %s
+            WHERE sub.path_id = %s
+        """, [parent_id, category_id])
+
+        if table_exists('oc_product_to_category'):
+            cursor.execute("""
+                INSERT IGNORE INTO oc_product_to_category (product_id, category_id)
+                SELECT DISTINCT p2c.product_id, anc.path_id
+                FROM oc_product_to_category p2c
+                JOIN oc_category_path sub ON sub.category_id = p2c.category_id AND sub.path_id = %s
+                JOIN oc_category_path anc ON anc.category_id = %s
+            """, [category_id, parent_id])
+
+    cursor.execute(
+        "UPDATE oc_category SET parent_id = %s, date_modified = NOW() WHERE category_id = %s",
+        [parent_id, category_id]
+    )
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_KEY = 'opencart:category_index_generation'
+
+
+class CategoryIndex:
+    """
+    Process-local copy of the category tree built from oc_category and
+    oc_category_path.
+
+    Answers "which categories are above X" and "which categories are below
+    X" from memory. The index is versioned by a generation counter kept in
+    Django's default cache: category writes bump it on commit and every
+    process rebuilds on its next lookup. That only reaches other processes
+    when the default cache is shared between them (check myapp.W001);
+    with a local-memory cache only the writing process sees the bump, so
+    every process also rebuilds once its copy is older than
+    `OPENCART_CATEGORY_INDEX_MAX_AGE` seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._loaded_at = 0
+        self._paths = {}
+        self._parents = {}
+        self._children = defaultdict(list)
+
+    def _current_generation(self):
+        return current_category_generation()
+
+    def load(self):
+        generation = self._current_generation()
+        parents = {}
+        children = defaultdict(list)
+        paths = defaultdict(list)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT category_id, parent_id FROM oc_category ORDER BY sort_order, category_id")
+            for category_id, parent_id in cursor.fetchall():
+                parents[category_id] = parent_id or 0
+                children[parent_id or 0].append(category_id)
+
+            cursor.execute("SELECT category_id, path_id, level FROM oc_category_path ORDER BY category_id, level")
+            for category_id, path_id, level in cursor.fetchall():
+                paths[category_id].append((path_id, level))
+
+        with self._lock:
+            self._parents = parents
+            self._children = children
+            self._paths = dict(paths)
+            self._generation = generation
+            self._loaded_at = time.monotonic()
+        logger.info(f"Loaded category index with {len(parents)} categories (generation {generation})")
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'OPENCART_CATEGORY_INDEX_MAX_AGE', 300)
+
+    def _ensure_loaded(self, category_ids=()):
+        if self._generation != self._current_generation():
+            self.load()
+        elif time.monotonic() - self._loaded_at > self.max_age:
+            # A bump made in another process may never reach this one
+            self.load()
+        elif any(category_id not in self._parents for category_id in category_ids):
+            # Possibly a category created since the last load; pick it up, but
+            # don't let lookups of ids that don't exist force constant reloads
+            if time.monotonic() - self._loaded_at > 1:
+                self.load()
+
+    @property
+    def generation(self):
+        self._ensure_loaded()
+        return self._generation
+
+    def path(self, category_id):
+        """(path_id, level) rows of `category_id`, root first, itself included."""
+        self._ensure_loaded([category_id])
+        return list(self._paths.get(category_id, []))
+
+    def ancestors(self, category_id):
+        """Ids of the categories above `category_id`, root first."""
+        return [path_id for path_id, _ in self.path(category_id) if path_id != category_id]
+
+    def expand(self, category_ids):
+        """`category_ids` followed by all their ancestors, without duplicates."""
+        category_ids = list(category_ids)
+        self._ensure_loaded(category_ids)
+        expanded = []
+        for category_id in category_ids:
+            expanded.append(category_id)
+            expanded.extend(
+                path_id for path_id, _ in self._paths.get(category_id, []) if path_id != category_id
+            )
+        return list(dict.fromkeys(expanded))
+
+    def parent(self, category_id):
+        self._ensure_loaded([category_id])
+        return self._parents.get(category_id)
+
+    def children(self, category_id):
+        """Direct children of `category_id` (0 for top-level categories)."""
+        self._ensure_loaded()
+        return list(self._children.get(category_id, []))
+
+    def descendants(self, category_id):
+        """All categories below `category_id`, breadth first."""
+        self._ensure_loaded()
+        found = []
+        queue = list(self._children.get(category_id, []))
+        while queue:
+            child = queue.pop(0)
+            found.append(child)
+            queue.extend(self._children.get(child, []))
+        return found
+
+
+category_index = CategoryIndex()
+
+
+def current_category_generation():
+    return cache.get(GENERATION_CACHE_KEY, 0)
+
+
+def bump_category_generation():
+    try:
+        return cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, None)
+        return 1
+
+
+def invalidate_category_index():
+    """Mark every process's category index stale once the current transaction commits."""
+    transaction.on_commit(bump_category_generation)
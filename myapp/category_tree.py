@@ -0,0 +1,89 @@
+import hashlib
+import logging
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from .category_index import current_category_generation
+
+logger = logging.getLogger(__name__)
+
+TREE_CACHE_PREFIX = 'opencart:category_tree'
+
+TreeSnapshot = namedtuple('TreeSnapshot', ['content', 'etag'])
+
+
+def build_category_tree(store_id, language_id):
+    """
+    Nested enabled categories of a store, in menu order, with two queries.
+
+    Each node carries its OpenCart `path` ("1_5_8") from oc_category_path.
+    As in the storefront menu, a category whose parent is disabled or not
+    in the store is left out together with its subtree.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.category_id, c.parent_id, cd.name, c.image, c.`column`, c.sort_order
+            FROM oc_category c
+            JOIN oc_category_to_store c2s ON c2s.category_id = c.category_id AND c2s.store_id = %s
+            LEFT JOIN oc_category_description cd
+                ON cd.category_id = c.category_id AND cd.language_id = %s
+            WHERE c.status = 1
+            ORDER BY c.sort_order, cd.name, c.category_id
+        """, [store_id, language_id])
+        rows = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT cp.category_id, GROUP_CONCAT(cp.path_id ORDER BY cp.level SEPARATOR '_')
+            FROM oc_category_path cp
+            JOIN oc_category_to_store c2s ON c2s.category_id = cp.category_id AND c2s.store_id = %s
+            GROUP BY cp.category_id
+        """, [store_id])
+        paths = dict(cursor.fetchall())
+
+    nodes = {}
+    for category_id, parent_id, name, image, column, sort_order in rows:
+        nodes[category_id] = {
+            'category_id': category_id,
+            'parent_id': parent_id or 0,
+            'name': name or '',
+            'image': image or '',
+            'column': column,
+            'sort_order': sort_order,
+            'path': paths.get(category_id) or str(category_id),
+            'children': [],
+        }
+
+    roots = []
+    for node in nodes.values():
+        if not node['parent_id']:
+            roots.append(node)
+        elif node['parent_id'] in nodes:
+            nodes[node['parent_id']]['children'].append(node)
+    return roots
+
+
+def get_tree_snapshot(store_id, language_id):
+    """
+    The serialized category tree of a store and language, built at most once
+    per category generation.
+
+    Category writes bump the generation on commit, so the next request
+    rebuilds. `OPENCART_CATEGORY_TREE_TTL` bounds how long changes made
+    outside this API (e.g. in the OpenCart admin) can go unnoticed.
+    """
+    key = f'{TREE_CACHE_PREFIX}:{current_category_generation()}:{store_id}:{language_id}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        content = JSONRenderer().render({
+            'store_id': store_id,
+            'language_id': language_id,
+            'categories': build_category_tree(store_id, language_id),
+        })
+        snapshot = TreeSnapshot(content, '"%s"' % hashlib.sha1(content).hexdigest())
+        cache.set(key, tuple(snapshot), getattr(settings, 'OPENCART_CATEGORY_TREE_TTL', 3600))
+        logger.info(f"Built category tree for store {store_id}, language {language_id}")
+    return TreeSnapshot(*snapshot)
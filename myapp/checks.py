@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The category index and table registry generations live in the default
+    cache and product version tokens in `OPENCART_PRODUCT_CACHE`; other
+    processes only see a bump or an invalidation when that cache is shared.
+    """
+    if settings.DEBUG:
+        return []
+    aliases = {
+        'default': "category and schema changes",
+        getattr(settings, 'OPENCART_PRODUCT_CACHE', 'products'): "product invalidations",
+    }
+    warnings = []
+    for alias, what in aliases.items():
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend in PROCESS_LOCAL_CACHES:
+            warnings.append(Warning(
+                f"The '{alias}' cache is local to each process, so {what} are not "
+                f"seen by other worker processes.",
+                hint=f"Configure a shared backend (Redis, Memcached, database) for CACHES['{alias}'].",
+                id='myapp.W001',
+            ))
+    return warnings
@@ -0,0 +1,103 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import ArticleComment
+
+
+class CommentTree:
+    """
+    Comment threads for one or more articles, assembled in memory.
+
+    All comments are fetched with a single query and linked parent to
+    children here, so serializing a thread of any size never goes back to
+    the database. `max_depth` limits how many reply levels are returned and
+    `per_level_limit` caps the replies listed under each comment.
+    """
+
+    def __init__(self, comments, max_depth=None, per_level_limit=None):
+        self.max_depth = max_depth
+        self.per_level_limit = per_level_limit
+        self._top_level = defaultdict(list)
+        self._children = defaultdict(list)
+        comment_ids = {comment.article_comment_id for comment in comments}
+        for comment in comments:
+            if comment.parent_id and comment.parent_id in comment_ids:
+                self._children[comment.parent_id].append(comment)
+            else:
+                self._top_level[comment.article_id].append(comment)
+
+    @classmethod
+    def for_articles(cls, article_ids, max_depth=None, per_level_limit=None):
+        if max_depth is None:
+            max_depth = getattr(settings, 'OPENCART_COMMENT_MAX_DEPTH', None)
+        comments = list(
+            ArticleComment.objects
+            .filter(article_id__in=list(article_ids))
+            .order_by('date_added', 'article_comment_id')
+        )
+        return cls(comments, max_depth=max_depth, per_level_limit=per_level_limit)
+
+    @classmethod
+    def for_roots(cls, roots, max_depth=None, per_level_limit=None):
+        """
+        Reply previews below an already fetched page of comments.
+
+        Replies are read one level per query, so the cost follows the depth
+        shown rather than the size of the thread. With `per_level_limit`
+        only the first replies of each comment are read from the database.
+        """
+        roots = list(roots)
+        limit = getattr(settings, 'OPENCART_COMMENT_MAX_DEPTH', None)
+        if max_depth is None:
+            max_depth = getattr(settings, 'OPENCART_COMMENT_PREVIEW_DEPTH', limit)
+        if limit is not None and max_depth is not None:
+            max_depth = min(max_depth, limit)
+
+        comments = list(roots)
+        parent_ids = [comment.article_comment_id for comment in roots]
+        depth = 0
+        while parent_ids and (max_depth is None or depth < max_depth):
+            queryset = ArticleComment.objects.filter(parent_id__in=parent_ids)
+            if per_level_limit is not None:
+                queryset = queryset.annotate(position=Window(
+                    RowNumber(),
+                    partition_by=F('parent_id'),
+                    order_by=[F('date_added').asc(), F('article_comment_id').asc()]
+                )).filter(position__lte=per_level_limit)
+            level = list(queryset.order_by('date_added', 'article_comment_id'))
+            comments.extend(level)
+            parent_ids = [comment.article_comment_id for comment in level]
+            depth += 1
+
+        tree = cls(comments, max_depth=max_depth, per_level_limit=per_level_limit)
+        for root in roots:
+            root._tree_depth = 0
+        return tree
+
+    def _limit(self, comments, depth):
+        if self.per_level_limit is not None:
+            comments = comments[:self.per_level_limit]
+        for comment in comments:
+            comment._tree_depth = depth
+        return comments
+
+    def top_level(self, article_id):
+        return self._limit(self._top_level.get(article_id, []), 0)
+
+    def replies(self, comment):
+        depth = getattr(comment, '_tree_depth', 0) + 1
+        if self.max_depth is not None and depth > self.max_depth:
+            return []
+        return self._limit(self._children.get(comment.article_comment_id, []), depth)
+
+
+def record_reply(comment):
+    """Bump the denormalized reply counters on the parent of a new comment."""
+    if comment.parent_id:
+        ArticleComment.objects.filter(article_comment_id=comment.parent_id).update(
+            reply_count=F('reply_count') + 1,
+            last_reply_at=comment.date_added
+        )
@@ -0,0 +1,76 @@
+from .writers import chunked, get_bulk_chunk_size, insert_rows
+
+
+class DescriptionTable:
+    """
+    A per-language description table keyed on (`key`, language_id).
+
+    `columns` are the text columns written from each description dict;
+    missing values are stored as empty strings, as OpenCart does.
+    """
+
+    def __init__(self, table, key, columns):
+        self.table = table
+        self.key = key
+        self.columns = list(columns)
+
+
+ARTICLE_DESCRIPTIONS = DescriptionTable(
+    'oc_article_description', 'article_id',
+    ['name', 'description', 'image', 'tag', 'meta_title', 'meta_description', 'meta_keyword'],
+)
+PRODUCT_DESCRIPTIONS = DescriptionTable(
+    'oc_product_description', 'product_id',
+    ['name', 'description', 'tag', 'meta_title', 'meta_description', 'meta_keyword'],
+)
+CATEGORY_DESCRIPTIONS = DescriptionTable(
+    'oc_category_description', 'category_id',
+    ['name', 'description', 'meta_title', 'meta_description', 'meta_keyword'],
+)
+
+
+def description_rows(spec, parent_id, descriptions):
+    """Rows ordered like (key, language_id, *columns), one per language."""
+    rows = {}
+    for description in descriptions:
+        language_id = description.get('language_id', 1)
+        # A language supplied twice keeps its last description
+        rows[language_id] = [parent_id, language_id] + [
+            description.get(column) or '' for column in spec.columns
+        ]
+    return list(rows.values())
+
+
+def write_descriptions(cursor, spec, items, prune=False, chunk_size=None):
+    """
+    Upsert the descriptions of many parents with multi-row INSERTs.
+
+    `items` is an iterable of (parent_id, descriptions) pairs. Rows are
+    written with `INSERT ... ON DUPLICATE KEY UPDATE` on (key, language_id),
+    so existing languages are updated in place instead of being deleted and
+    reinserted. With `prune` the languages a parent was not given are
+    removed, one DELETE per chunk of parents. Returns the number of rows sent.
+    """
+    chunk_size = chunk_size or get_bulk_chunk_size()
+    rows, languages = [], {}
+    for parent_id, descriptions in items:
+        parent_rows = description_rows(spec, parent_id, descriptions)
+        rows.extend(parent_rows)
+        languages[parent_id] = [row[1] for row in parent_rows]
+
+    count = insert_rows(
+        cursor, spec.table, [spec.key, 'language_id'] + spec.columns, rows,
+        chunk_size, update_columns=spec.columns
+    )
+
+    if prune:
+        for parent_ids in chunked(languages, chunk_size):
+            kept = [(parent_id, language_id) for parent_id in parent_ids for language_id in languages[parent_id]]
+            query = f"DELETE FROM {spec.table} WHERE `{spec.key}` IN ({', '.join(['%s'] * len(parent_ids))})"
+            params = list(parent_ids)
+            if kept:
+                query += f" AND (`{spec.key}`, language_id) NOT IN ({', '.join(['(%s, %s)'] * len(kept))})"
+                params += [value for pair in kept for value in pair]
+            cursor.execute(query, params)
+
+    return count
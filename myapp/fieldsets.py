@@ -0,0 +1,44 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_field_list(value):
+    """Split a comma separated query parameter into a set of names, or None if absent."""
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    ModelSerializer mixin for the `?fields=` and `?expand=` query parameters.
+
+    `fields` limits the response to the listed fields. Relations named in
+    `Meta.expandable_fields` are only serialized when they are listed in
+    `expand` or `fields`, and `Meta.default_expand` names the relations
+    returned when the request selects neither. Serializers load their
+    relations from `self.fields`, so a relation that is not selected is never
+    queried. Selection only applies to reads of the top-level serializer;
+    writes and nested uses always see every field.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or self.root not in (self, self.parent):
+            return fields
+
+        requested = parse_field_list(request.query_params.get('fields'))
+        expand = parse_field_list(request.query_params.get('expand'))
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        if requested is None and expand is None:
+            expand = set(getattr(self.Meta, 'default_expand', ()))
+        expanded = (expand or set()) | ((requested or set()) & expandable)
+
+        return {
+            name: field for name, field in fields.items()
+            if (name in expanded if name in expandable else requested is None or name in requested)
+        }
+
+    def selected_relations(self, names):
+        """The relations among `names` that this serializer will render."""
+        return [name for name in names if name in self.fields]
@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+from django.db import connection
+
+# Child tables of oc_product that are nested in ProductSerializer. They are
+# keyed by a plain product_id column rather than a foreign key, so they are
+# loaded here in batches instead of through related managers.
+PRODUCT_RELATIONS = {
+    'descriptions': (
+        'oc_product_description',
+        ['language_id', 'name', 'description', 'tag', 'meta_title', 'meta_description', 'meta_keyword'],
+        'language_id',
+    ),
+    'images': ('oc_product_image', ['image', 'sort_order'], 'sort_order'),
+    'categories': ('oc_product_to_category', ['category_id'], 'category_id'),
+    'specials': (
+        'oc_product_special',
+        ['customer_group_id', 'priority', 'price', 'date_start', 'date_end'],
+        'priority',
+    ),
+}
+
+ARTICLE_RELATIONS = {
+    'descriptions': (
+        'oc_article_description',
+        ['language_id', 'name', 'description', 'image', 'tag', 'meta_title', 'meta_description', 'meta_keyword'],
+        'language_id',
+    ),
+}
+
+CUSTOMER_RELATIONS = {
+    'addresses': (
+        'oc_address',
+        ['address_id', 'customer_id', 'firstname', 'lastname', 'company', 'address_1', 'address_2',
+         'city', 'postcode', 'country_id', 'zone_id', 'custom_field', 'default'],
+        'address_id',
+    ),
+}
+
+
+def fetch_grouped(table, key, columns, ids, order_by=None):
+    """
+    Fetch the rows of `table` whose `key` is in `ids` with a single query.
+
+    Returns a dict mapping each key value to a list of row dicts.
+    """
+    grouped = defaultdict(list)
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return grouped
+
+    placeholders = ', '.join(['%s'] * len(ids))
+    query = (
+        f"SELECT {key}, {', '.join(f'`{c}`' for c in columns)} FROM {table} "
+        f"WHERE {key} IN ({placeholders})"
+    )
+    if order_by:
+        query += f" ORDER BY {key}, {order_by}"
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, ids)
+        for row in cursor.fetchall():
+            grouped[row[0]].append(dict(zip(columns, row[1:])))
+    return grouped
+
+
+def load_relations(instances, key, relations, names=None):
+    """
+    Attach nested relations to a batch of instances, one query per relation.
+
+    `relations` maps each relation name to its (table, columns, order_by)
+    and `names` selects which of them to load (all of them when None). Each
+    relation is stored as a list attribute on the instance, which is where
+    the serializers' nested fields read it from.
+    """
+    instances = list(instances)
+    ids = [getattr(instance, key) for instance in instances]
+    for name in relations if names is None else names:
+        table, columns, order_by = relations[name]
+        grouped = fetch_grouped(table, key, columns, ids, order_by)
+        for instance in instances:
+            setattr(instance, name, grouped.get(getattr(instance, key), []))
+    for instance in instances:
+        instance._relations_loaded = True
+    return instances
+
+
+def load_product_relations(products, relations=None):
+    """Attach nested relations (for example `product.images`) to a batch of products."""
+    return load_relations(products, 'product_id', PRODUCT_RELATIONS, relations)
+
+
+def load_article_relations(articles, relations=None):
+    """Attach nested relations (for example `article.descriptions`) to a batch of articles."""
+    return load_relations(articles, 'article_id', ARTICLE_RELATIONS, relations)
+
+
+def load_customer_relations(customers, relations=None):
+    """Attach nested relations (for example `customer.addresses`) to a batch of customers."""
+    return load_relations(customers, 'customer_id', CUSTOMER_RELATIONS, relations)
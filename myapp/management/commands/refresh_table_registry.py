@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from myapp.schema import bump_schema_generation, schema_changed, table_registry
+
+
+class Command(BaseCommand):
+    help = "Reload the cached list of database tables in every API process"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to inspect")
+        parser.add_argument('--list', action='store_true', help="Print the oc_* tables that were found")
+
+    def handle(self, *args, **options):
+        generation = bump_schema_generation()
+        schema_changed.send(sender=self.__class__)
+        tables = table_registry.load(options['database'])
+
+        if options['list']:
+            for table in sorted(t for t in tables if t.startswith('oc_')):
+                self.stdout.write(table)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Table registry refreshed: {len(tables)} tables, generation {generation}"
+        ))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+TABLE = 'oc_article_comment'
+
+COLUMNS = {
+    'reply_count': "ADD COLUMN `reply_count` INT NOT NULL DEFAULT 0",
+    'last_reply_at': "ADD COLUMN `last_reply_at` DATETIME NULL",
+}
+
+INDEXES = {
+    'idx_article_comment_thread_date': ('article_id', 'parent_id', 'date_added'),
+    'idx_article_comment_thread_rating': ('article_id', 'parent_id', 'rating'),
+}
+
+
+class Command(BaseCommand):
+    help = "Add the reply counter columns and thread indexes to oc_article_comment and backfill them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to update")
+        parser.add_argument('--no-backfill', action='store_true', help="Only add missing columns and indexes")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with connection.cursor() as cursor:
+            columns = {c.name for c in connection.introspection.get_table_description(cursor, TABLE)}
+            missing = [ddl for name, ddl in COLUMNS.items() if name not in columns]
+            if missing:
+                cursor.execute(f"ALTER TABLE {TABLE} " + ", ".join(missing))
+                self.stdout.write(f"Added {len(missing)} column(s) to {TABLE}")
+
+            constraints = connection.introspection.get_constraints(cursor, TABLE)
+            for name, index_columns in INDEXES.items():
+                if name not in constraints:
+                    cursor.execute(
+                        f"CREATE INDEX `{name}` ON {TABLE} ("
+                        + ", ".join(f"`{column}`" for column in index_columns) + ")"
+                    )
+                    self.stdout.write(f"Created index {name}")
+
+            if options['no_backfill']:
+                return
+
+            with transaction.atomic(using=options['database']):
+                cursor.execute(f"UPDATE {TABLE} SET reply_count = 0, last_reply_at = NULL")
+                cursor.execute(f"""
+                    UPDATE {TABLE} c
+                    JOIN (
+                        SELECT parent_id, COUNT(*) AS replies, MAX(date_added) AS last_reply
+                        FROM {TABLE}
+                        WHERE parent_id IS NOT NULL
+                        GROUP BY parent_id
+                    ) r ON r.parent_id = c.article_comment_id
+                    SET c.reply_count = r.replies, c.last_reply_at = r.last_reply
+                """)
+                updated = cursor.rowcount
+
+        self.stdout.write(self.style.SUCCESS(f"Reply counters backfilled for {updated} comment(s)"))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from myapp.schema import bump_schema_generation, schema_changed
+
+TABLE = 'oc_customer'
+
+# Generated columns the API relies on, added before the indexes
+COLUMNS = {
+    'search_name': "ADD COLUMN `search_name` VARCHAR(65) AS (CONCAT(firstname, ' ', lastname)) VIRTUAL",
+}
+
+# token is a TEXT column, so it can only be indexed on a prefix; issued
+# tokens are 40 characters long. The others back the prefix search.
+INDEXES = {
+    'idx_customer_token': "(`token`(40))",
+    'idx_customer_email': "(`email`)",
+    'idx_customer_telephone': "(`telephone`)",
+    'idx_customer_lastname': "(`lastname`)",
+    'idx_customer_search_name': "(`search_name`)",
+}
+
+
+class Command(BaseCommand):
+    help = "Create the oc_customer generated columns and indexes used by the API that are missing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to update")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what is missing")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with connection.cursor() as cursor:
+            columns = {c.name for c in connection.introspection.get_table_description(cursor, TABLE)}
+            missing_columns = [name for name in COLUMNS if name not in columns]
+            existing = connection.introspection.get_constraints(cursor, TABLE)
+            missing_indexes = [name for name in INDEXES if name not in existing]
+
+            if options['dry_run']:
+                for name in missing_columns:
+                    self.stdout.write(f"Missing column {name} on {TABLE}")
+                for name in missing_indexes:
+                    self.stdout.write(f"Missing index {name} on {TABLE}")
+                self.stdout.write(self.style.SUCCESS(
+                    f"{len(missing_columns)} column(s) and {len(missing_indexes)} index(es) missing"
+                ))
+                return
+
+            for name in missing_columns:
+                cursor.execute(f"ALTER TABLE {TABLE} {COLUMNS[name]}")
+                self.stdout.write(f"Added column {name}")
+            for name in missing_indexes:
+                cursor.execute(f"CREATE INDEX `{name}` ON {TABLE} {INDEXES[name]}")
+                self.stdout.write(f"Created index {name}")
+
+        if missing_columns:
+            # Let every process pick up the new columns
+            bump_schema_generation()
+            schema_changed.send(sender=self.__class__)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Customer schema up to date ({len(missing_columns)} column(s), {len(missing_indexes)} index(es) created)"
+        ))
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+# Composite indexes behind the product filters and orderings of
+# GET /api/products/, per table. InnoDB appends the primary key to every
+# secondary index, so product_id is implied as the cursor tie breaker.
+INDEXES = {
+    'oc_product': {
+        'idx_product_status_price': ('status', 'price'),
+        'idx_product_status_date_modified': ('status', 'date_modified'),
+        'idx_product_manufacturer_price': ('manufacturer_id', 'price'),
+        'idx_product_price': ('price',),
+        'idx_product_date_modified': ('date_modified',),
+    },
+    # Category and store filters look up product ids by category / store
+    'oc_product_to_category': {
+        'idx_product_to_category_category': ('category_id', 'product_id'),
+    },
+    'oc_product_to_store': {
+        'idx_product_to_store_store': ('store_id', 'product_id'),
+    },
+    # Name prefix search and ordering within one language
+    'oc_product_description': {
+        'idx_product_description_language_name': ('language_id', 'name'),
+    },
+}
+
+
+def covering_index(constraints, columns):
+    """Name of an existing index whose leading columns are `columns`, if any."""
+    for name, constraint in constraints.items():
+        if constraint['index'] or constraint['primary_key'] or constraint['unique']:
+            if tuple(constraint['columns'][:len(columns)]) == tuple(columns):
+                return name
+    return None
+
+
+class Command(BaseCommand):
+    help = "Report the indexes the product filters need and create the missing ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to check")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what is missing")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        created = missing = 0
+        with connection.cursor() as cursor:
+            tables = set(connection.introspection.table_names(cursor))
+            for table, indexes in INDEXES.items():
+                if table not in tables:
+                    self.stdout.write(self.style.WARNING(f"Table {table} does not exist, skipping"))
+                    continue
+
+                constraints = connection.introspection.get_constraints(cursor, table)
+                for name, columns in indexes.items():
+                    column_list = ', '.join(columns)
+                    existing = covering_index(constraints, columns)
+                    if existing:
+                        self.stdout.write(f"{table} ({column_list}): covered by {existing}")
+                        continue
+
+                    missing += 1
+                    if options['dry_run']:
+                        self.stdout.write(f"{table} ({column_list}): missing, would create {name}")
+                        continue
+                    cursor.execute(
+                        f"CREATE INDEX `{name}` ON {table} ({', '.join(f'`{c}`' for c in columns)})"
+                    )
+                    created += 1
+                    self.stdout.write(f"{table} ({column_list}): created {name}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{missing} index(es) missing"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Product indexes up to date ({created} index(es) created)"))
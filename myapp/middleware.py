@@ -0,0 +1,100 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .api_history import api_history_recorder
+from .authentication import ApiKeyUser
+from .profiling import QueryBudgetExceeded, QueryProfiler, get_query_budget, query_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfilerMiddleware:
+    """
+    Counts the SQL run by each request and reports it.
+
+    Adds a `Server-Timing: db;dur=...` header, aggregates per-endpoint
+    statistics for /api/_metrics and enforces the `query_budget` declared on
+    views: over-budget requests are logged, or raise QueryBudgetExceeded
+    when OPENCART_QUERY_BUDGET_ACTION is 'raise' (as in tests).
+
+    Queries issued while a streaming response is being consumed happen after
+    the middleware returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'OPENCART_QUERY_PROFILER', True):
+            return self.get_response(request)
+
+        profiler = QueryProfiler()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profiler))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+
+        endpoint = f"{request.method} {match.view_name or match.route}"
+        query_metrics.record(endpoint, profiler)
+
+        db_ms = profiler.duration * 1000
+        response['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{profiler.count} queries"'
+        response['X-Query-Count'] = str(profiler.count)
+
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and profiler.count > budget:
+            duplicates = ', '.join(f"{count}x {sql[:120]}" for sql, count in profiler.duplicates[:3])
+            message = (
+                f"{endpoint} ran {profiler.count} queries, over its budget of {budget}"
+                + (f"; repeated: {duplicates}" if duplicates else "")
+            )
+            if getattr(settings, 'OPENCART_QUERY_BUDGET_ACTION', 'log') == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = get_query_budget(view_func, request.method)
+        return None
+
+
+class ApiHistoryMiddleware:
+    """
+    Records each request authenticated with an API key in oc_api_history.
+
+    Only the views listing `ApiKeyAuthentication` in their
+    `authentication_classes` accept a key; it is not a default class.
+
+    The request thread only appends (api_id, call, ip) to
+    `api_history_recorder`. With OPENCART_API_HISTORY = 'async' its
+    background thread writes the rows in batches, 'sync' writes them right
+    after the response (as in tests) and 'off' records nothing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        mode = getattr(settings, 'OPENCART_API_HISTORY', 'async')
+        # DRF stores the authenticated user on the request; checking the type
+        # avoids evaluating Django's lazy session user for other requests
+        user = request.__dict__.get('user')
+        if mode == 'off' or type(user) is not ApiKeyUser:
+            return response
+
+        match = getattr(request, 'resolver_match', None)
+        call = f"{request.method} {match.view_name if match else request.path}"
+        api_history_recorder.record(user.api_id, call, request.META.get('REMOTE_ADDR'))
+        if mode == 'sync':
+            api_history_recorder.flush()
+        return response
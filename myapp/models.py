@@ -47,6 +47,7 @@ class Address(models.Model):
     country_id = models.IntegerField()
     zone_id = models.IntegerField()
     custom_field = models.TextField(blank=True, null=True)
+    default = models.BooleanField(default=False)
 
     class Meta:
         managed = False
@@ -57,8 +58,9 @@ class Address(models.Model):
 
 class Article(models.Model):
     article_id = models.AutoField(primary_key=True)
-    image = models.CharField(max_length=255, blank=True, null=True)
-    sort_order = models.IntegerField(default=0)
+    topic_id = models.IntegerField(default=0)
+    author = models.CharField(max_length=64, blank=True, default='')
+    rating = models.IntegerField(default=0)
     status = models.BooleanField(default=True)
     date_added = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
@@ -73,8 +75,10 @@ class Article(models.Model):
 class ArticleDescription(models.Model):
     article_id = models.OneToOneField(Article, on_delete=models.DO_NOTHING, primary_key=True)
     language_id = models.IntegerField()
-    title = models.CharField(max_length=255)
+    name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
+    image = models.CharField(max_length=255, blank=True, null=True)
+    tag = models.TextField(blank=True, null=True)
     meta_title = models.CharField(max_length=255, blank=True, null=True)
     meta_description = models.CharField(max_length=255, blank=True, null=True)
     meta_keyword = models.CharField(max_length=255, blank=True, null=True)
@@ -84,7 +88,7 @@ class ArticleDescription(models.Model):
         db_table = 'oc_article_description'
 
     def __str__(self):
-        return f"{self.title} ({self.language_id})"
+        return f"{self.name} ({self.language_id})"
 
 class ArticleComment(models.Model):
     article_comment_id = models.AutoField(primary_key=True)
@@ -96,6 +100,9 @@ class ArticleComment(models.Model):
     rating = models.IntegerField(default=0)
     status = models.IntegerField(default=1)
     date_added = models.DateTimeField(auto_now_add=True)
+    # Denormalized counters, added by `manage.py sync_comment_counters`
+    reply_count = models.IntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'oc_article_comment'
@@ -293,7 +300,7 @@ class Product(models.Model):
         return f"Product {self.product_id}: {self.model}"
 
 class ProductDescription(models.Model):
-    product_id = models.OneToOneField(Product, on_delete=models.DO_NOTHING, primary_key=True)
+    product_id = models.OneToOneField(Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='product_id')
     language_id = models.IntegerField()
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
@@ -324,6 +331,14 @@ class ProductToCategory(models.Model):
         managed = False
         db_table = 'oc_product_to_category'
 
+class ProductToStore(models.Model):
+    product_id = models.IntegerField(primary_key=True)
+    store_id = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'oc_product_to_store'
+
 class ProductDiscount(models.Model):
     product_discount_id = models.AutoField(primary_key=True)
     product_id = models.IntegerField()
@@ -0,0 +1,140 @@
+import binascii
+import datetime
+import json
+from base64 import b64decode, b64encode
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination over a unique, indexed integer key.
+
+    Each page is fetched with `WHERE key > last_seen ORDER BY key LIMIT n`,
+    so the cost of a page does not grow with its position in the table.
+    """
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
+class CompositeKeysetPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over (`?ordering=` field, unique key).
+
+    DRF's CursorPagination only keeps the first ordering field in the
+    cursor and pages through ties by offset. Here the cursor holds both
+    values of the boundary row. The next page is read with
+    `field > value OR (field = value AND key > last_key)`, the row-value
+    comparison `(field, key) > (value, last_key)` written out, so rows
+    sharing a value are neither skipped nor repeated when data changes
+    between requests. Without a valid `?ordering=` the pages follow `key`
+    alone.
+    """
+    key = None
+    ordering_choices = ()
+    default_ordering = None
+
+    def get_ordering(self, request, queryset, view):
+        field = request.query_params.get('ordering', self.default_ordering)
+        if field not in self.ordering_choices:
+            return (self.key,)
+        return (field, '-' + self.key if field.startswith('-') else self.key)
+
+    def encode_position(self, instance, reverse):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        payload = json.dumps({'o': self.ordering[0], 'p': values, 'r': int(reverse)})
+        encoded = b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_position(self, request):
+        """(values, reverse) of the request's cursor, or (None, False) on the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode()).decode())
+            values, reverse = cursor['p'], bool(cursor['r'])
+            if cursor['o'] != self.ordering[0] or len(values) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def after(self, values, reverse):
+        """Rows strictly past `values` in the (possibly reversed) page order."""
+        condition, equal = Q(), {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            forward = not field.startswith('-')
+            lookup = 'gt' if forward != reverse else 'lt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        values, reverse = self.decode_position(request)
+
+        if values is not None:
+            queryset = queryset.filter(self.after(values, reverse))
+        ordering = [f[1:] if f.startswith('-') else '-' + f for f in self.ordering] if reverse else self.ordering
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        # Coming back from a later page there is always a next one
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_position(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_position(self.page[0], reverse=True)
+
+
+class ProductCursorPagination(CompositeKeysetPagination):
+    """
+    Products by `?ordering=` price, date_modified or name (annotated by
+    `filter_products`), or by product_id.
+    """
+    key = 'product_id'
+    ordering_choices = ('price', '-price', 'date_modified', '-date_modified', 'name', '-name')
+
+
+class ApiHistoryCursorPagination(KeysetCursorPagination):
+    ordering = '-api_history_id'
+
+
+class CommentCursorPagination(CompositeKeysetPagination):
+    """Comments by `?ordering=` date_added (the default) or rating."""
+    page_size = 20
+    max_page_size = 100
+    key = 'article_comment_id'
+    default_ordering = 'date_added'
+    ordering_choices = ('date_added', '-date_added', 'rating', '-rating')
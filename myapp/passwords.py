@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.utils.crypto import constant_time_compare
+from rest_framework.exceptions import Throttled
+
+from .schema import column_exists
+
+logger = logging.getLogger(__name__)
+
+LEGACY_SHA1 = re.compile(r'[0-9a-f]{40}')
+LEGACY_MD5 = re.compile(r'[0-9a-f]{32}')
+PHP_BCRYPT_PREFIXES = ('$2y$', '$2a$', '$2b$')
+
+
+class PasswordPoolSaturated(Throttled):
+    default_detail = "Too many password checks in progress, try again shortly."
+
+
+class LoginLocked(Throttled):
+    default_detail = "Too many failed login attempts, try again later."
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _sha1(value):
+    return hashlib.sha1(value.encode()).hexdigest()
+
+
+def verify_password(raw_password, encoded, salt=None):
+    """
+    Check `raw_password` against a stored hash in any format OpenCart used.
+
+    Besides Django's own hashers this accepts PHP `password_hash()` bcrypt
+    hashes (when the bcrypt package is installed), OpenCart's salted SHA1
+    `sha1(salt . sha1(salt . sha1(password)))` and unsalted MD5. Returns
+    (valid, new_encoded), where new_encoded is a fresh hash to store when the
+    old one is valid but legacy or outdated.
+    """
+    if not encoded:
+        return False, None
+
+    if encoded.startswith(PHP_BCRYPT_PREFIXES):
+        try:
+            import bcrypt
+        except ImportError:
+            logger.warning("bcrypt is not installed, PHP password hashes cannot be checked")
+            return False, None
+        valid = bcrypt.checkpw(raw_password.encode(), ('$2b$' + encoded[4:]).encode())
+        return valid, make_password(raw_password) if valid else None
+
+    if LEGACY_SHA1.fullmatch(encoded) and salt:
+        valid = constant_time_compare(encoded, _sha1(salt + _sha1(salt + _sha1(raw_password))))
+        return valid, make_password(raw_password) if valid else None
+
+    if LEGACY_MD5.fullmatch(encoded):
+        valid = constant_time_compare(encoded, hashlib.md5(raw_password.encode()).hexdigest())
+        return valid, make_password(raw_password) if valid else None
+
+    if not check_password(raw_password, encoded):
+        return False, None
+    try:
+        must_update = identify_hasher(encoded).must_update(encoded)
+    except ValueError:
+        must_update = False
+    return True, make_password(raw_password) if must_update else None
+
+
+class PasswordPool:
+    """
+    Runs password hashing in a pool of worker processes.
+
+    Hashing is CPU bound and holds the GIL, so it is moved out of the request
+    threads. At most `OPENCART_PASSWORD_WORKERS` jobs run and
+    `OPENCART_PASSWORD_QUEUE_DEPTH` more may wait; beyond that requests fail
+    fast with 429 instead of queueing. With no workers configured the job
+    runs inline.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _start(self, workers):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'myproject.settings'),)
+                )
+                depth = getattr(settings, 'OPENCART_PASSWORD_QUEUE_DEPTH', 0)
+                self._slots = threading.BoundedSemaphore(workers + depth)
+            return self._executor, self._slots
+
+    def run(self, func, *args):
+        workers = getattr(settings, 'OPENCART_PASSWORD_WORKERS', 0)
+        if not workers:
+            return func(*args)
+
+        executor, slots = self._start(workers)
+        if not slots.acquire(blocking=False):
+            raise PasswordPoolSaturated(wait=1)
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            logger.error("Password worker pool broke, restarting it")
+            self.shutdown()
+            return func(*args)
+        finally:
+            slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool()
+
+
+def hash_password(raw_password):
+    return password_pool.run(make_password, raw_password)
+
+
+def customer_salt(customer_id):
+    """The legacy salt of a customer, for rows migrated from older OpenCart versions."""
+    if not column_exists('oc_customer', 'salt'):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT salt FROM oc_customer WHERE customer_id = %s", [customer_id])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def check_customer_password(customer, raw_password):
+    """
+    Check a customer's password in the worker pool, upgrading legacy hashes.
+
+    When the stored hash is valid but legacy or outdated it is replaced by a
+    current one in the same call.
+    """
+    salt = customer_salt(customer.customer_id) if LEGACY_SHA1.fullmatch(customer.password or '') else None
+    valid, new_encoded = password_pool.run(verify_password, raw_password, customer.password, salt)
+    if valid and new_encoded:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE oc_customer SET password = %s WHERE customer_id = %s",
+                [new_encoded, customer.customer_id]
+            )
+        customer.password = new_encoded
+    return valid
+
+
+def _failure_keys(email, ip):
+    email_key = 'opencart:login_failures:email:' + hashlib.sha256(email.strip().lower().encode()).hexdigest()
+    keys = [(email_key, getattr(settings, 'OPENCART_LOGIN_FAILURE_LIMIT', 5))]
+    if ip:
+        keys.append(('opencart:login_failures:ip:' + ip, getattr(settings, 'OPENCART_LOGIN_IP_FAILURE_LIMIT', 20)))
+    return keys
+
+
+def check_login_allowed(email, ip):
+    """Raise LoginLocked when the email or IP has too many recent failures, before any hashing."""
+    keys = _failure_keys(email, ip)
+    counts = cache.get_many([key for key, _ in keys])
+    if any(counts.get(key, 0) >= limit for key, limit in keys):
+        raise LoginLocked(wait=getattr(settings, 'OPENCART_LOGIN_FAILURE_WINDOW', 300))
+
+
+def record_login_failure(email, ip):
+    window = getattr(settings, 'OPENCART_LOGIN_FAILURE_WINDOW', 300)
+    for key, _ in _failure_keys(email, ip):
+        cache.add(key, 0, window)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.set(key, 1, window)
+
+
+def clear_login_failures(email):
+    cache.delete(_failure_keys(email, None)[0][0])
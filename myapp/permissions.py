@@ -0,0 +1,17 @@
+from rest_framework.permissions import BasePermission
+
+from .authentication import ApiKeyUser, CustomerUser
+
+
+class IsApiClient(BasePermission):
+    """Allows only requests authenticated with an API client's `X-Api-Key`."""
+
+    def has_permission(self, request, view):
+        return isinstance(request.user, ApiKeyUser)
+
+
+class IsCustomer(BasePermission):
+    """Allows only requests authenticated with a customer's `Authorization: Token`."""
+
+    def has_permission(self, request, view):
+        return isinstance(request.user, CustomerUser)
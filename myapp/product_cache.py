@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import threading
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_CACHE_PREFIX = 'opencart:product'
+
+CachedProduct = namedtuple('CachedProduct', ['data', 'etag', 'last_modified'])
+
+
+class ProductCache:
+    """
+    Read-through cache of serialized product detail payloads.
+
+    Entries live in the Django cache named by `OPENCART_PRODUCT_CACHE`, a
+    dedicated alias so payloads never cull the counters kept in the default
+    cache; point it at a shared backend to share entries between processes.
+    Each product has a version token, and entries are stored under it per
+    variant (language, store, fieldset). Invalidating a
+    product replaces its token, so every variant is dropped at once without
+    enumerating keys. `OPENCART_PRODUCT_CACHE_TTL` bounds how long changes
+    made outside this API can go unnoticed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, 'OPENCART_PRODUCT_CACHE', 'products')]
+
+    def _version_key(self, product_id):
+        return f'{PRODUCT_CACHE_PREFIX}:{product_id}:version'
+
+    def version(self, product_id):
+        """The current version token of a product; read it before the database."""
+        key = self._version_key(product_id)
+        version = self.backend.get(key)
+        if version is None:
+            self.backend.add(key, uuid.uuid4().hex, None)
+            version = self.backend.get(key)
+        return version
+
+    def _entry_key(self, product_id, version, variant):
+        return f'{PRODUCT_CACHE_PREFIX}:{product_id}:{version}:{variant}'
+
+    def get(self, product_id, version, variant):
+        entry = self.backend.get(self._entry_key(product_id, version, variant))
+        with self._lock:
+            self._stats['hits' if entry is not None else 'misses'] += 1
+        return CachedProduct(*entry) if entry is not None else None
+
+    def set(self, product_id, version, variant, data, last_modified):
+        etag = '"%s"' % hashlib.sha1(JSONRenderer().render(data)).hexdigest()
+        entry = CachedProduct(data, etag, last_modified)
+        self.backend.set(
+            self._entry_key(product_id, version, variant), tuple(entry),
+            getattr(settings, 'OPENCART_PRODUCT_CACHE_TTL', 300)
+        )
+        return entry
+
+    def invalidate(self, product_ids):
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        self.backend.set_many(
+            {self._version_key(product_id): uuid.uuid4().hex for product_id in product_ids}, None
+        )
+        with self._lock:
+            self._stats['invalidations'] += len(product_ids)
+        logger.info(f"Invalidated cached payloads of {len(product_ids)} products")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else None
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = dict.fromkeys(self._stats, 0)
+
+
+product_cache = ProductCache()
+
+
+def product_variant(request):
+    """The part of a detail request that changes the payload, as a cache key suffix."""
+    params = request.query_params
+    fieldset = f"{params.get('fields', '')}|{params.get('expand', '')}"
+    variant = f"{params.get('language_id', '')}:{params.get('store_id', '')}"
+    if fieldset != '|':
+        variant += ':' + hashlib.md5(fieldset.encode()).hexdigest()
+    return variant
+
+
+def invalidate_products(product_ids):
+    """Drop the cached payloads of `product_ids` once the current transaction commits."""
+    product_ids = list(product_ids)
+    transaction.on_commit(lambda: product_cache.invalidate(product_ids))
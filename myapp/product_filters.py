@@ -0,0 +1,109 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F, FilteredRelation, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ProductToCategory, ProductToStore
+
+
+class ProductFilterError(ValueError):
+    pass
+
+
+def parse_since(value):
+    """An aware datetime from an ISO 8601 date or datetime, or None if it is not one."""
+    try:
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            since = datetime.datetime.combine(day, datetime.time.min) if day else None
+    except ValueError:
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ProductFilterError(f"{name} must be an integer")
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ProductFilterError(f"{name} must be a number")
+
+
+def filter_products(queryset, params):
+    """
+    Apply the storefront filters in `params` to a Product queryset.
+
+    Supports `category_id` (products are linked to every ancestor of their
+    categories, so this includes subcategories), `store_id`,
+    `manufacturer_id`, `price_min`, `price_max`, `status`, `modified_since`
+    and a `name` prefix. Category and store are semi-joins on
+    oc_product_to_category and oc_product_to_store. The name, in
+    `language_id` (default 1), comes from a single join on
+    oc_product_description. It is only joined when `name` is filtered on or
+    `?ordering=` sorts by it, and is annotated as `name` for the cursor;
+    as in the storefront, products without a description in that language
+    are then left out. Raises ProductFilterError on malformed values.
+    """
+    category_id = _int_param(params, 'category_id')
+    if category_id is not None:
+        queryset = queryset.filter(
+            product_id__in=ProductToCategory.objects.filter(category_id=category_id).values('product_id')
+        )
+
+    store_id = _int_param(params, 'store_id')
+    if store_id is not None:
+        queryset = queryset.filter(
+            product_id__in=ProductToStore.objects.filter(store_id=store_id).values('product_id')
+        )
+
+    manufacturer_id = _int_param(params, 'manufacturer_id')
+    if manufacturer_id is not None:
+        queryset = queryset.filter(manufacturer_id=manufacturer_id)
+
+    price_min = _decimal_param(params, 'price_min')
+    if price_min is not None:
+        queryset = queryset.filter(price__gte=price_min)
+    price_max = _decimal_param(params, 'price_max')
+    if price_max is not None:
+        queryset = queryset.filter(price__lte=price_max)
+
+    product_status = _int_param(params, 'status')
+    if product_status is not None:
+        queryset = queryset.filter(status=product_status)
+
+    modified_since = params.get('modified_since')
+    if modified_since:
+        since = parse_since(modified_since)
+        if since is None:
+            raise ProductFilterError("modified_since must be an ISO 8601 date or datetime")
+        queryset = queryset.filter(date_modified__gte=since)
+
+    name = params.get('name')
+    if name or params.get('ordering', '').lstrip('-') == 'name':
+        language_id = _int_param(params, 'language_id') or 1
+        queryset = queryset.annotate(
+            local_description=FilteredRelation(
+                'productdescription', condition=Q(productdescription__language_id=language_id)
+            ),
+            name=F('local_description__name'),
+        ).filter(local_description__name__isnull=False)
+        if name:
+            queryset = queryset.filter(name__istartswith=name)
+    return queryset
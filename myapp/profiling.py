@@ -0,0 +1,121 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalize a statement so repeats with different parameters compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryProfiler:
+    """
+    `connection.execute_wrapper` callable recording the statements run while
+    it is installed.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.slowest_duration = 0.0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[fingerprint(sql)] += 1
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+    @property
+    def duplicates(self):
+        """Fingerprints executed more than once, most repeated first."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count > 1]
+
+
+class QueryMetrics:
+    """Per-endpoint query statistics aggregated across requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, profiler):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'db_time_ms': 0.0,
+                'duplicate_queries': 0,
+                'slowest_ms': 0.0,
+                'slowest_sql': None,
+            })
+            stats['requests'] += 1
+            stats['queries'] += profiler.count
+            stats['max_queries'] = max(stats['max_queries'], profiler.count)
+            stats['db_time_ms'] += profiler.duration * 1000
+            stats['duplicate_queries'] += sum(count - 1 for _, count in profiler.duplicates)
+            if profiler.slowest_duration * 1000 >= stats['slowest_ms']:
+                stats['slowest_ms'] = profiler.slowest_duration * 1000
+                stats['slowest_sql'] = profiler.slowest_sql
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                stats = dict(stats)
+                stats['avg_queries'] = stats['queries'] / stats['requests']
+                stats['avg_db_time_ms'] = stats['db_time_ms'] / stats['requests']
+                result[endpoint] = stats
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+query_metrics = QueryMetrics()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_query_budget(view_func, method):
+    """
+    Resolve the `query_budget` declared on a view class.
+
+    The budget is either an int for every method or a dict keyed by viewset
+    action ('list', 'retrieve', ...) or HTTP method ('GET', 'POST', ...).
+    """
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if not isinstance(budget, dict):
+        return budget
+
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    if action in budget:
+        return budget[action]
+    return budget.get(method)
@@ -0,0 +1,122 @@
+from collections import defaultdict
+
+from .writers import insert_rows
+
+
+class ChildTable:
+    """
+    Describes a child table of a parent row for reconciliation.
+
+    `key_columns` form the natural key a desired row is matched on and
+    `value_columns` are the columns compared and updated in place. Tables
+    with a surrogate primary key name it in `id_column`; rows of other tables
+    are addressed by parent id plus natural key.
+    """
+
+    def __init__(self, table, key_columns, value_columns=(), id_column=None):
+        self.table = table
+        self.key_columns = list(key_columns)
+        self.value_columns = list(value_columns)
+        self.id_column = id_column
+
+
+PRODUCT_CHILD_TABLES = {
+    'descriptions': ChildTable(
+        'oc_product_description',
+        ['language_id'],
+        ['name', 'description', 'tag', 'meta_title', 'meta_description', 'meta_keyword'],
+    ),
+    'categories': ChildTable('oc_product_to_category', ['category_id']),
+    'images': ChildTable('oc_product_image', ['image'], ['sort_order'], id_column='product_image_id'),
+    'specials': ChildTable(
+        'oc_product_special',
+        ['customer_group_id', 'date_start', 'date_end'],
+        ['priority', 'price'],
+        id_column='product_special_id',
+    ),
+    'stores': ChildTable('oc_product_to_store', ['store_id']),
+}
+
+
+def _where_row(spec, parent_column):
+    columns = [spec.id_column] if spec.id_column else [parent_column] + spec.key_columns
+    return ' AND '.join(f"`{c}` = %s" for c in columns)
+
+
+def _row_address(spec, parent_id, current_id, key):
+    return [current_id] if spec.id_column else [parent_id] + list(key)
+
+
+def reconcile_children(cursor, spec, parent_column, parent_id, desired_rows):
+    """
+    Make the child rows of `parent_id` in `spec.table` match `desired_rows`.
+
+    The current rows are loaded and matched to the desired ones on the
+    natural key; only rows that are new, changed or gone are written.
+    Inserts go out as one multi-row INSERT and deletes as one DELETE, while
+    updates take a statement per changed row (the driver does not batch
+    UPDATEs). Returns a dict of insert/update/delete counts.
+    """
+    select_columns = ([spec.id_column] if spec.id_column else []) + spec.key_columns + spec.value_columns
+    cursor.execute(
+        f"SELECT {', '.join(f'`{c}`' for c in select_columns)} FROM {spec.table} WHERE `{parent_column}` = %s",
+        [parent_id]
+    )
+
+    # Natural key -> list of (surrogate id, values); a list because images
+    # and specials may legitimately repeat a key
+    current = defaultdict(list)
+    offset = 1 if spec.id_column else 0
+    key_length = len(spec.key_columns)
+    for row in cursor.fetchall():
+        key = tuple(row[offset:offset + key_length])
+        values = tuple(row[offset + key_length:])
+        current[key].append((row[0] if spec.id_column else None, values))
+
+    inserts, updates = [], []
+    seen = set()
+    for row in desired_rows:
+        key = tuple(row.get(c) for c in spec.key_columns)
+        values = tuple(row.get(c) for c in spec.value_columns)
+        if not spec.id_column:
+            # Tables keyed on (parent, natural key) can hold each key once
+            if key in seen:
+                continue
+            seen.add(key)
+        if current.get(key):
+            current_id, current_values = current[key].pop(0)
+            if current_values != values:
+                updates.append(list(values) + _row_address(spec, parent_id, current_id, key))
+        else:
+            inserts.append([parent_id] + list(key) + list(values))
+
+    deletes = [
+        _row_address(spec, parent_id, current_id, key)
+        for key, rows in current.items()
+        for current_id, _ in rows
+    ]
+
+    if deletes:
+        if spec.id_column:
+            placeholders = ', '.join(['%s'] * len(deletes))
+            cursor.execute(
+                f"DELETE FROM {spec.table} WHERE `{spec.id_column}` IN ({placeholders})",
+                [row[0] for row in deletes]
+            )
+        else:
+            key_list = ', '.join(f'`{c}`' for c in spec.key_columns)
+            placeholders = ', '.join(['(' + ', '.join(['%s'] * len(spec.key_columns)) + ')'] * len(deletes))
+            cursor.execute(
+                f"DELETE FROM {spec.table} WHERE `{parent_column}` = %s AND ({key_list}) IN ({placeholders})",
+                [parent_id] + [value for row in deletes for value in row[1:]]
+            )
+
+    if updates:
+        assignments = ', '.join(f"`{c}` = %s" for c in spec.value_columns)
+        cursor.executemany(
+            f"UPDATE {spec.table} SET {assignments} WHERE {_where_row(spec, parent_column)}", updates
+        )
+
+    insert_rows(cursor, spec.table, [parent_column] + spec.key_columns + spec.value_columns, inserts)
+
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(deletes)}
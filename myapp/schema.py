@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.dispatch import Signal, receiver
+
+logger = logging.getLogger(__name__)
+
+# Sent when the database schema is known to have changed (tables added or
+# dropped). Every TableRegistry in the process reloads on the next lookup.
+schema_changed = Signal()
+
+GENERATION_CACHE_KEY = 'opencart:schema_generation'
+
+
+class TableRegistry:
+    """
+    Process-wide record of which tables (and columns) exist in each database.
+
+    The table list is loaded with one introspection query the first time it
+    is needed and then answered from memory; the columns of a table are
+    loaded the same way on first use. Other processes can be told to
+    reload by bumping the schema generation stored in Django's cache (see the
+    `refresh_table_registry` management command); the generation is polled
+    at most every OPENCART_SCHEMA_RECHECK_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._columns = {}
+        self._generation = {}
+        self._checked_at = {}
+
+    def _current_generation(self):
+        return cache.get(GENERATION_CACHE_KEY, 0)
+
+    def _is_stale(self, using):
+        recheck = getattr(settings, 'OPENCART_SCHEMA_RECHECK_SECONDS', 60)
+        if time.monotonic() - self._checked_at.get(using, 0) < recheck:
+            return False
+        self._checked_at[using] = time.monotonic()
+        return self._current_generation() != self._generation.get(using)
+
+    def load(self, using='default'):
+        generation = self._current_generation()
+        with connections[using].cursor() as cursor:
+            tables = frozenset(connections[using].introspection.table_names(cursor))
+        with self._lock:
+            self._tables[using] = tables
+            self._columns = {key: value for key, value in self._columns.items() if key[0] != using}
+            self._generation[using] = generation
+            self._checked_at[using] = time.monotonic()
+        logger.info(f"Loaded {len(tables)} table names for database '{using}'")
+        return tables
+
+    def tables(self, using='default'):
+        tables = self._tables.get(using)
+        if tables is None or self._is_stale(using):
+            tables = self.load(using)
+        return tables
+
+    def exists(self, table_name, using='default'):
+        return table_name in self.tables(using)
+
+    def columns(self, table_name, using='default'):
+        # Checking the tables first drops stale columns along with them
+        if not self.exists(table_name, using):
+            return frozenset()
+        columns = self._columns.get((using, table_name))
+        if columns is None:
+            connection = connections[using]
+            with connection.cursor() as cursor:
+                description = connection.introspection.get_table_description(cursor, table_name)
+            columns = frozenset(column.name for column in description)
+            with self._lock:
+                self._columns[(using, table_name)] = columns
+        return columns
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._columns.clear()
+            self._generation.clear()
+            self._checked_at.clear()
+
+
+table_registry = TableRegistry()
+
+
+def table_exists(table_name, using='default'):
+    return table_registry.exists(table_name, using)
+
+
+def column_exists(table_name, column_name, using='default'):
+    return column_name in table_registry.columns(table_name, using)
+
+
+def bump_schema_generation():
+    """Tell every process sharing the cache to reload its table list."""
+    try:
+        return cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, None)
+        return 1
+
+
+@receiver(schema_changed)
+def refresh_on_schema_change(sender, **kwargs):
+    table_registry.clear()
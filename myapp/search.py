@@ -0,0 +1,42 @@
+from django.conf import settings
+
+from .models import Customer
+from .schema import column_exists
+
+# Generated column holding "firstname lastname", created with its index by
+# `manage.py sync_customer_indexes`
+SEARCH_NAME_COLUMN = 'search_name'
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_customers(query, limit=None):
+    """
+    Customers whose email, telephone, full name or last name starts with `query`.
+
+    Each field is matched by its own `LIKE 'prefix%'` branch of a UNION, so
+    every branch is a short range scan on that column's index and stops at
+    `limit` rows; the matching customers are then read with the same query.
+    Without the generated name column the full name branch falls back to an
+    unindexed CONCAT.
+    """
+    limit = limit or getattr(settings, 'OPENCART_CUSTOMER_SEARCH_LIMIT', 20)
+    if column_exists('oc_customer', SEARCH_NAME_COLUMN):
+        name_expression = f"`{SEARCH_NAME_COLUMN}`"
+    else:
+        name_expression = "CONCAT(firstname, ' ', lastname)"
+
+    branches = ["`email`", "`telephone`", name_expression, "`lastname`"]
+    union = " UNION ".join(
+        f"(SELECT customer_id FROM oc_customer WHERE {expression} LIKE %s "
+        f"ORDER BY {expression} LIMIT {int(limit)})"
+        for expression in branches
+    )
+    pattern = escape_like(query) + '%'
+    return list(Customer.objects.raw(
+        f"SELECT c.* FROM oc_customer c JOIN ({union}) m ON m.customer_id = c.customer_id "
+        f"ORDER BY c.email, c.customer_id LIMIT {int(limit)}",
+        [pattern] * len(branches)
+    ))
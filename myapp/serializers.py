@@ -1,8 +1,18 @@
 from rest_framework import serializers
 from .models import Category, CategoryDescription, Product, ProductImage, ProductDiscount, ProductSpecial, ProductAttribute, ProductToCategory, Customer, Address, Article, ArticleDescription, ArticleComment, Api, ApiIp, ApiHistory, ProductDescription, CategoryFilter, CategoryPath, CategoryToLayout, CategoryToStore, CouponCategory
-from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
-from django.db import transaction, connection
+from django.db import models, transaction, connection
+from .comments import CommentTree
+from .descriptions import ARTICLE_DESCRIPTIONS, CATEGORY_DESCRIPTIONS, PRODUCT_DESCRIPTIONS, write_descriptions
+from .fieldsets import SparseFieldsetMixin
+from .passwords import (
+    check_customer_password, check_login_allowed, clear_login_failures, hash_password, record_login_failure
+)
+from .loaders import (
+    CUSTOMER_RELATIONS, PRODUCT_RELATIONS, load_article_relations, load_customer_relations, load_product_relations
+)
+from .reconcile import PRODUCT_CHILD_TABLES, reconcile_children
+from .verification import verify
 import logging
 import hashlib
 from django.utils.crypto import get_random_string
@@ -17,7 +27,7 @@ class CustomerRegisterSerializer(serializers.ModelSerializer):
         fields = ['firstname', 'lastname', 'email', 'telephone', 'password']
 
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data['password'])  # Hash password
+        validated_data['password'] = hash_password(validated_data['password'])  # Hash password
         return Customer.objects.create(**validated_data)
 
 class CustomerLoginSerializer(serializers.Serializer):
@@ -25,14 +35,22 @@ class CustomerLoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
     def validate(self, data):
+        request = self.context.get('request')
+        ip = request.META.get('REMOTE_ADDR') if request else None
+        # Repeated failures are refused before any password is hashed
+        check_login_allowed(data['email'], ip)
+
         try:
             user = Customer.objects.get(email=data['email'])
         except Customer.DoesNotExist:
+            record_login_failure(data['email'], ip)
             raise serializers.ValidationError("Invalid email or password")
 
-        if not check_password(data['password'], user.password):
+        if not check_customer_password(user, data['password']):
+            record_login_failure(data['email'], ip)
             raise serializers.ValidationError("Invalid email or password")
 
+        clear_login_failures(data['email'])
         return user
 
 class CategoryFilterSerializer(serializers.ModelSerializer):
@@ -102,15 +120,15 @@ class CategorySerializer(serializers.ModelSerializer):
         category = Category.objects.create(**validated_data)
 
         # Create category description
-        CategoryDescription.objects.create(
-            category_id=category.category_id,
-            language_id=language_id,
-            name=name,
-            description=description,
-            meta_title=meta_title,
-            meta_description=meta_description,
-            meta_keyword=meta_keyword
-        )
+        with connection.cursor() as cursor:
+            write_descriptions(cursor, CATEGORY_DESCRIPTIONS, [(category.category_id, [{
+                'language_id': language_id,
+                'name': name,
+                'description': description,
+                'meta_title': meta_title,
+                'meta_description': meta_description,
+                'meta_keyword': meta_keyword
+            }])])
 
         # Create related data
         for filter_data in filters_data:
@@ -151,16 +169,17 @@ class CategorySerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
 
-        # Update description if provided
+        # Update the description of the given language if provided
         if name is not None:
-            CategoryDescription.objects.filter(category_id=instance.category_id).update(
-                name=name,
-                description=description,
-                meta_title=meta_title,
-                meta_description=meta_description,
-                meta_keyword=meta_keyword,
-                language_id=language_id
-            )
+            with connection.cursor() as cursor:
+                write_descriptions(cursor, CATEGORY_DESCRIPTIONS, [(instance.category_id, [{
+                    'language_id': language_id or 1,
+                    'name': name,
+                    'description': description,
+                    'meta_title': meta_title,
+                    'meta_description': meta_description,
+                    'meta_keyword': meta_keyword
+                }])])
 
         # Update related data if provided
         if filters_data is not None:
@@ -210,7 +229,17 @@ class ProductSpecialSerializer(serializers.ModelSerializer):
         model = ProductSpecial
         fields = ['customer_group_id', 'priority', 'price', 'date_start', 'date_end']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        products = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        # Load the selected nested relations for the whole page up front
+        load_product_relations(
+            [p for p in products if not getattr(p, '_relations_loaded', False)],
+            self.child.selected_relations(PRODUCT_RELATIONS)
+        )
+        return super().to_representation(products)
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     descriptions = ProductDescriptionSerializer(many=True, required=False)
     images = ProductImageSerializer(many=True, required=False)
     categories = ProductToCategorySerializer(many=True, required=False)
@@ -228,6 +257,14 @@ class ProductSerializer(serializers.ModelSerializer):
             'specials'
         ]
         read_only_fields = ['product_id', 'date_added', 'date_modified']
+        list_serializer_class = ProductListSerializer
+        expandable_fields = ['descriptions', 'images', 'categories', 'specials']
+        default_expand = expandable_fields
+
+    def to_representation(self, instance):
+        if not getattr(instance, '_relations_loaded', False):
+            load_product_relations([instance], self.selected_relations(PRODUCT_RELATIONS))
+        return super().to_representation(instance)
 
     def create(self, validated_data):
         descriptions_data = validated_data.pop('descriptions', [])
@@ -237,8 +274,8 @@ class ProductSerializer(serializers.ModelSerializer):
 
         product = Product.objects.create(**validated_data)
 
-        for description_data in descriptions_data:
-            ProductDescription.objects.create(product=product, **description_data)
+        with connection.cursor() as cursor:
+            write_descriptions(cursor, PRODUCT_DESCRIPTIONS, [(product.product_id, descriptions_data)])
 
         for image_data in images_data:
             ProductImage.objects.create(product=product, **image_data)
@@ -252,37 +289,34 @@ class ProductSerializer(serializers.ModelSerializer):
         return product
 
     def update(self, instance, validated_data):
-        descriptions_data = validated_data.pop('descriptions', [])
-        images_data = validated_data.pop('images', [])
-        categories_data = validated_data.pop('categories', [])
-        specials_data = validated_data.pop('specials', [])
+        children_data = {
+            name: validated_data.pop(name)
+            for name in ('descriptions', 'images', 'categories', 'specials')
+            if name in validated_data
+        }
 
         # Update product fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
-        # Update descriptions
-        instance.productdescription_set.all().delete()
-        for description_data in descriptions_data:
-            ProductDescription.objects.create(product=instance, **description_data)
+        # Reconcile the supplied relations, writing only the rows that differ
+        with connection.cursor() as cursor:
+            for name, rows in children_data.items():
+                reconcile_children(cursor, PRODUCT_CHILD_TABLES[name], 'product_id', instance.product_id, rows)
 
-        # Update images
-        instance.productimage_set.all().delete()
-        for image_data in images_data:
-            ProductImage.objects.create(product=instance, **image_data)
-
-        # Update categories
-        instance.producttocategory_set.all().delete()
-        for category_data in categories_data:
-            ProductToCategory.objects.create(product=instance, **category_data)
+        return instance
 
-        # Update specials
-        instance.productspecial_set.all().delete()
-        for special_data in specials_data:
-            ProductSpecial.objects.create(product=instance, **special_data)
+class ProductStockSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(required=False)
+    price = serializers.DecimalField(max_digits=15, decimal_places=4, required=False)
+    status = serializers.BooleanField(required=False)
 
-        return instance
+    def validate(self, data):
+        if not any(field in data for field in ('quantity', 'price', 'status')):
+            raise serializers.ValidationError("At least one of quantity, price or status is required.")
+        return data
 
 class ProductDiscountSerializer(serializers.ModelSerializer):
     class Meta:
@@ -299,10 +333,20 @@ class AddressSerializer(serializers.ModelSerializer):
         model = Address
         fields = ['address_id', 'firstname', 'lastname', 'company', 
                  'address_1', 'address_2', 'city', 'postcode', 
-                 'country_id', 'zone_id', 'default', 'customer']
-        read_only_fields = ['address_id', 'customer']
+                 'country_id', 'zone_id', 'default', 'customer_id']
+        read_only_fields = ['address_id', 'customer_id']
+
+class CustomerListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        customers = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        # Load the addresses of the whole page with one query
+        load_customer_relations(
+            [c for c in customers if not getattr(c, '_relations_loaded', False)],
+            self.child.selected_relations(CUSTOMER_RELATIONS)
+        )
+        return super().to_representation(customers)
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     addresses = AddressSerializer(many=True, read_only=True)
     password = serializers.CharField(write_only=True, required=False)
 
@@ -311,6 +355,14 @@ class CustomerSerializer(serializers.ModelSerializer):
         fields = ['customer_id', 'firstname', 'lastname', 'email', 
                  'telephone', 'password', 'status', 'addresses']
         read_only_fields = ['customer_id']
+        list_serializer_class = CustomerListSerializer
+        expandable_fields = ['addresses']
+        default_expand = expandable_fields
+
+    def to_representation(self, instance):
+        if not getattr(instance, '_relations_loaded', False):
+            load_customer_relations([instance], self.selected_relations(CUSTOMER_RELATIONS))
+        return super().to_representation(instance)
 
     def validate(self, data):
         logger.info(f"Validating customer data: {data}")
@@ -331,11 +383,10 @@ class CustomerSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         logger.info(f"Updating customer {instance.customer_id} with data: {validated_data}")
+        if 'password' in validated_data:
+            validated_data['password'] = hash_password(validated_data['password'])
         try:
             with transaction.atomic():
-                if 'password' in validated_data:
-                    validated_data['password'] = make_password(validated_data['password'])
-                
                 # Update fields
                 for attr, value in validated_data.items():
                     setattr(instance, attr, value)
@@ -345,10 +396,12 @@ class CustomerSerializer(serializers.ModelSerializer):
                 logger.info(f"Customer {instance.customer_id} updated successfully")
                 
                 # Verify the update
-                updated = Customer.objects.get(customer_id=instance.customer_id)
-                logger.info(f"Verified updated data: {updated.__dict__}")
+                verify(
+                    f"customer {instance.customer_id} saved",
+                    lambda: Customer.objects.filter(customer_id=instance.customer_id).exists()
+                )
                 
-                return updated
+                return instance
         except Exception as e:
             logger.error(f"Error updating customer: {str(e)}")
             raise serializers.ValidationError(f"Failed to update customer: {str(e)}")
@@ -356,7 +409,7 @@ class CustomerSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         logger.info(f"Creating new customer with data: {validated_data}")
         if 'password' in validated_data:
-            validated_data['password'] = make_password(validated_data['password'])
+            validated_data['password'] = hash_password(validated_data['password'])
         return super().create(validated_data)
 
 class ArticleDescriptionSerializer(serializers.ModelSerializer):
@@ -371,27 +424,74 @@ class ArticleCommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ArticleComment
         fields = ['article_comment_id', 'article', 'parent', 'customer',
-                 'author', 'comment', 'rating', 'status', 'date_added', 'replies']
-        read_only_fields = ['article_comment_id', 'article', 'date_added', 'customer']
+                 'author', 'comment', 'rating', 'status', 'date_added',
+                 'reply_count', 'last_reply_at', 'replies']
+        read_only_fields = ['article_comment_id', 'article', 'date_added', 'customer',
+                            'reply_count', 'last_reply_at']
 
     def get_replies(self, obj):
-        replies = ArticleComment.objects.filter(parent=obj)
-        serializer = ArticleCommentSerializer(replies, many=True)
+        tree = self.context.get('comment_tree')
+        if tree is None:
+            # Only the replies below this comment, reused for every nested level
+            tree = CommentTree.for_roots([obj])
+            self.context['comment_tree'] = tree
+        serializer = ArticleCommentSerializer(tree.replies(obj), many=True, context=self.context)
         return serializer.data
 
-class ArticleSerializer(serializers.ModelSerializer):
+class ArticleListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        articles = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        load_article_relations(
+            [a for a in articles if not getattr(a, '_relations_loaded', False)],
+            self.child.description_relations()
+        )
+        # Load the comment threads of the whole page with one query
+        if 'comments' in self.child.fields and 'comment_tree' not in self.context:
+            self.context['comment_tree'] = CommentTree.for_articles(a.article_id for a in articles)
+        return super().to_representation(articles)
+
+class ArticleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    title = serializers.SerializerMethodField()
     descriptions = ArticleDescriptionSerializer(many=True, required=False)
-    comments = ArticleCommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
 
     class Meta:
         model = Article
         fields = ['article_id', 'topic_id', 'author', 'rating', 
-                 'status', 'date_added', 'date_modified', 
+                 'status', 'date_added', 'date_modified', 'title',
                  'descriptions', 'comments']
         read_only_fields = ['article_id', 'date_added', 'date_modified']
         extra_kwargs = {
             'topic_id': {'required': False}
         }
+        list_serializer_class = ArticleListSerializer
+        expandable_fields = ['descriptions', 'comments']
+        default_expand = ['descriptions']
+
+    def description_relations(self):
+        # The title is read from the descriptions, so either field needs them
+        return ['descriptions'] if {'descriptions', 'title'} & set(self.fields) else []
+
+    def to_representation(self, instance):
+        if not getattr(instance, '_relations_loaded', False):
+            load_article_relations([instance], self.description_relations())
+        return super().to_representation(instance)
+
+    def get_title(self, obj):
+        request = self.context.get('request')
+        language_id = request.query_params.get('language_id') if request else None
+        for description in obj.descriptions:
+            if str(description['language_id']) == language_id:
+                return description['name']
+        return obj.descriptions[0]['name'] if obj.descriptions else None
+
+    def get_comments(self, obj):
+        tree = self.context.get('comment_tree')
+        if tree is None:
+            tree = CommentTree.for_articles([obj.article_id])
+            self.context['comment_tree'] = tree
+        serializer = ArticleCommentSerializer(tree.top_level(obj.article_id), many=True, context=self.context)
+        return serializer.data
 
     def validate(self, data):
         # If this is a create operation (no instance exists)
@@ -409,24 +509,9 @@ class ArticleSerializer(serializers.ModelSerializer):
                 # Create the article first
                 article = Article.objects.create(**validated_data)
                 
-                # Create descriptions using raw SQL to match OpenCart's structure
+                # Write all languages with one multi-row INSERT
                 with connection.cursor() as cursor:
-                    for description in descriptions_data:
-                        cursor.execute("""
-                            INSERT INTO oc_article_description 
-                            (article_id, language_id, name, description, image, tag, meta_title, meta_description, meta_keyword)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, [
-                            article.article_id,
-                            description['language_id'],
-                            description['name'],
-                            description['description'],
-                            description.get('image', ''),
-                            description.get('tag', ''),
-                            description.get('meta_title', ''),
-                            description.get('meta_description', ''),
-                            description.get('meta_keyword', '')
-                        ])
+                    write_descriptions(cursor, ARTICLE_DESCRIPTIONS, [(article.article_id, descriptions_data)])
                 
                 return article
         except Exception as e:
@@ -448,27 +533,11 @@ class ArticleSerializer(serializers.ModelSerializer):
 
                 # Update descriptions only if provided
                 if descriptions_data is not None:
+                    # Upsert the supplied languages and drop the others
                     with connection.cursor() as cursor:
-                        # Delete existing descriptions
-                        cursor.execute("DELETE FROM oc_article_description WHERE article_id = %s", [instance.article_id])
-                        
-                        # Insert new descriptions
-                        for description in descriptions_data:
-                            cursor.execute("""
-                                INSERT INTO oc_article_description 
-                                (article_id, language_id, name, description, image, tag, meta_title, meta_description, meta_keyword)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            """, [
-                                instance.article_id,
-                                description['language_id'],
-                                description['name'],
-                                description['description'],
-                                description.get('image', ''),
-                                description.get('tag', ''),
-                                description.get('meta_title', ''),
-                                description.get('meta_description', ''),
-                                description.get('meta_keyword', '')
-                            ])
+                        write_descriptions(
+                            cursor, ARTICLE_DESCRIPTIONS, [(instance.article_id, descriptions_data)], prune=True
+                        )
 
                 return instance
         except Exception as e:
@@ -488,7 +557,7 @@ class ApiHistorySerializer(serializers.ModelSerializer):
         model = ApiHistory
         fields = ['api_history_id', 'call', 'ip', 'date_added']
 
-class ApiSerializer(serializers.ModelSerializer):
+class ApiSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     allowed_ips = ApiIpSerializer(many=True, read_only=True)
     history = ApiHistorySerializer(many=True, read_only=True)
 
@@ -496,6 +565,9 @@ class ApiSerializer(serializers.ModelSerializer):
         model = Api
         fields = ['api_id', 'username', 'key', 'status', 
                  'date_added', 'date_modified', 'allowed_ips', 'history']
+        # The full call history is served paginated by ApiViewSet.history
+        expandable_fields = ['allowed_ips', 'history']
+        default_expand = ['allowed_ips']
 
     def create(self, validated_data):
         # Generate a secure API key
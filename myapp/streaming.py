@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def get_stream_chunk_size():
+    return getattr(settings, 'OPENCART_STREAM_CHUNK_SIZE', 500)
+
+
+def iter_keyset_chunks(queryset, key, chunk_size=None):
+    """
+    Yield lists of rows from `queryset` ordered by `key`, one chunk at a time.
+
+    Every chunk is its own `WHERE key > last_seen LIMIT chunk_size` query, so
+    only one chunk is ever held in memory. MySQL drivers buffer the complete
+    result set of a query client-side, which is why this is used instead of
+    a single `.iterator()` over the whole table.
+    """
+    chunk_size = chunk_size or get_stream_chunk_size()
+    queryset = queryset.order_by(key)
+    last_key = None
+    while True:
+        chunk_qs = queryset
+        if last_key is not None:
+            chunk_qs = chunk_qs.filter(**{f'{key}__gt': last_key})
+        chunk = list(chunk_qs[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_row = chunk[-1]
+        last_key = last_row[key] if isinstance(last_row, dict) else getattr(last_row, key)
+
+
+def _encode(item):
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False)
+
+
+def json_array_stream(chunks, serialize):
+    yield '['
+    first = True
+    for chunk in chunks:
+        items = [_encode(item) for item in serialize(chunk)]
+        if not items:
+            continue
+        yield ('' if first else ',') + ','.join(items)
+        first = False
+    yield ']'
+
+
+def ndjson_stream(chunks, serialize):
+    for chunk in chunks:
+        items = [_encode(item) for item in serialize(chunk)]
+        if items:
+            yield '\n'.join(items) + '\n'
+
+
+def csv_stream(chunks, serialize, columns):
+    """CSV with a header row; nested lists and dicts are written as JSON."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for chunk in chunks:
+        for item in serialize(chunk):
+            writer.writerow({
+                key: _encode(value) if isinstance(value, (list, dict)) else value
+                for key, value in item.items()
+            })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def streaming_response(stream_format, chunks, serialize, filename=None, columns=None):
+    """
+    Build a StreamingHttpResponse emitting `chunks` as a JSON array, NDJSON or CSV.
+
+    `serialize` turns one chunk of rows into a list of plain dicts; CSV also
+    needs the list of `columns` to write.
+    """
+    if stream_format == 'ndjson':
+        body = ndjson_stream(chunks, serialize)
+    elif stream_format == 'csv':
+        body = csv_stream(chunks, serialize, columns)
+    else:
+        body = json_array_stream(chunks, serialize)
+    content_type = STREAM_FORMATS.get(stream_format) or EXPORT_FORMATS[stream_format]
+    response = StreamingHttpResponse(body, content_type=content_type)
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-cache'
+    return response
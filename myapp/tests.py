@@ -1,8 +1,28 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from unittest import mock
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
-from .models import Product
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from .models import (
+    Address, Api, ApiHistory, ApiIp, Article, ArticleComment, CategoryPath, Customer, Product, ProductToCategory
+)
+from .authentication import TokenCache, api_key_cache, token_cache
+from .api_history import ApiHistoryRecorder
+from .passwords import PasswordPool, PasswordPoolSaturated, verify_password
+import hashlib
+import threading
+from .schema import table_registry, table_exists
+from .cache_invalidation import InvalidationQueue
+from .category_index import category_index
+from .category_forest import ForestError, flatten_forest, order_forest
+from .product_cache import product_cache
+from .product_filters import ProductFilterError, filter_products
+from .management.commands.sync_product_indexes import covering_index
+from .verification import VerificationError, verify
+from .profiling import QueryProfiler, fingerprint
+from .descriptions import ARTICLE_DESCRIPTIONS, write_descriptions
 import json
 
 class ProductAPITest(TestCase):
@@ -76,3 +96,842 @@ class ProductAPITest(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['model'], "Updated Test Product")
+
+    def test_list_products_is_cursor_paginated(self):
+        for i in range(3):
+            data = dict(self.product_data, model=f"Paged Product {i}")
+            self.client.post(
+                reverse('product-list'),
+                data=json.dumps(data),
+                content_type='application/json'
+            )
+
+        response = self.client.get(reverse('product-list'), {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        next_page = self.client.get(response.data['next'])
+        first_ids = {p['product_id'] for p in response.data['results']}
+        next_ids = {p['product_id'] for p in next_page.data['results']}
+        self.assertFalse(first_ids & next_ids)
+
+    def test_stream_products_ndjson(self):
+        self.client.post(
+            reverse('product-list'),
+            data=json.dumps(self.product_data),
+            content_type='application/json'
+        )
+
+        response = self.client.get(reverse('product-list'), {'stream': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        models = [json.loads(line)['model'] for line in lines]
+        self.assertIn("Test Product", models)
+
+    def test_list_products_query_count_is_constant(self):
+        for i in range(5):
+            data = dict(self.product_data, model=f"Batched Product {i}")
+            self.client.post(
+                reverse('product-list'),
+                data=json.dumps(data),
+                content_type='application/json'
+            )
+
+        # One query for the page plus one per nested relation
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(all(p['descriptions'] for p in response.data['results']))
+
+    def test_sparse_fieldset_skips_unrequested_relations(self):
+        self.client.post(
+            reverse('product-list'),
+            data=json.dumps(self.product_data),
+            content_type='application/json'
+        )
+
+        # Only the page query runs when no relation is selected
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'), {'fields': 'product_id,model'})
+        self.assertEqual(set(response.data['results'][0]), {'product_id', 'model'})
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-list'), {'fields': 'product_id', 'expand': 'descriptions'})
+        self.assertEqual(set(response.data['results'][0]), {'product_id', 'descriptions'})
+
+    def test_bulk_import_reports_invalid_rows(self):
+        rows = [
+            dict(self.product_data, model="Bulk Product 1"),
+            {"quantity": "not a number"},
+            dict(self.product_data, model="Bulk Product 2"),
+        ]
+        response = self.client.post(
+            reverse('product-bulk'),
+            data=json.dumps(rows),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created_count'], 2)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1])
+        self.assertTrue(Product.objects.filter(model="Bulk Product 2").exists())
+
+    def test_bulk_import_accepts_ndjson(self):
+        body = "\n".join(
+            json.dumps(dict(self.product_data, model=f"NDJSON Product {i}")) for i in range(3)
+        )
+        response = self.client.post(
+            reverse('product-bulk') + '?chunk_size=2',
+            data=body,
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created_count'], 3)
+
+    def test_patch_product_only_touches_supplied_fields(self):
+        create_response = self.client.post(
+            reverse('product-list'),
+            data=json.dumps(self.product_data),
+            content_type='application/json'
+        )
+        product_id = create_response.data['product_id']
+
+        response = self.client.patch(
+            reverse('product-detail', kwargs={'product_id': product_id}),
+            data=json.dumps({'price': '79.99'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['price'], '79.9900')
+        self.assertEqual(response.data['model'], "Test Product")
+        self.assertEqual(len(response.data['descriptions']), 1)
+
+    def test_batch_stock_update(self):
+        create_response = self.client.post(
+            reverse('product-list'),
+            data=json.dumps(self.product_data),
+            content_type='application/json'
+        )
+        product_id = create_response.data['product_id']
+
+        response = self.client.patch(
+            reverse('product-stock'),
+            data=json.dumps([
+                {'product_id': product_id, 'quantity': 5, 'price': '49.50'},
+                {'product_id': 999999999, 'quantity': 1},
+            ]),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = {r['product_id']: r['status'] for r in response.data['results']}
+        self.assertEqual(results, {product_id: 'updated', 999999999: 'not_found'})
+
+        product = Product.objects.get(product_id=product_id)
+        self.assertEqual(product.quantity, 5)
+        self.assertEqual(str(product.price), '49.5000')
+
+    @override_settings(OPENCART_QUERY_BUDGET_ACTION='raise')
+    def test_product_list_stays_within_query_budget(self):
+        for i in range(5):
+            data = dict(self.product_data, model=f"Budget Product {i}")
+            self.client.post(
+                reverse('product-list'),
+                data=json.dumps(data),
+                content_type='application/json'
+            )
+
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertLessEqual(int(response['X-Query-Count']), 5)
+
+class TableRegistryTest(TestCase):
+    def setUp(self):
+        table_registry.clear()
+
+    def test_existence_checks_are_answered_from_memory(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(table_exists('oc_product'))
+        with self.assertNumQueries(0):
+            self.assertTrue(table_exists('oc_product_description'))
+            self.assertFalse(table_exists('oc_no_such_table'))
+
+
+class InvalidationQueueTest(SimpleTestCase):
+    @mock.patch('myapp.cache_invalidation.purge_tags')
+    def test_duplicate_tags_are_coalesced(self, purge_tags):
+        queue = InvalidationQueue(window=60)
+        with mock.patch('threading.Thread'):
+            for _ in range(1000):
+                queue.enqueue(('product', 'category'))
+            queue.enqueue(('menu',))
+        queue.flush()
+
+        purge_tags.assert_called_once_with({'product', 'category', 'menu'})
+
+
+class CategoryIndexTest(TestCase):
+    def test_new_category_ancestors_are_indexed(self):
+        client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            parent = client.post(reverse('category-create'), {'name': 'Parent'}, format='json')
+        parent_id = parent.data['category_id']
+        with self.captureOnCommitCallbacks(execute=True):
+            child = client.post(
+                reverse('category-create'), {'name': 'Child', 'parent_id': parent_id}, format='json'
+            )
+        child_id = child.data['category_id']
+
+        self.assertEqual(category_index.ancestors(child_id), [parent_id])
+        self.assertIn(child_id, category_index.children(parent_id))
+        with self.assertNumQueries(0):
+            self.assertEqual(category_index.expand([child_id]), [child_id, parent_id])
+
+    def test_index_is_reloaded_once_too_old(self):
+        category_index.load()
+        with mock.patch.object(category_index, 'load') as load:
+            category_index.children(0)
+            load.assert_not_called()
+            with override_settings(OPENCART_CATEGORY_INDEX_MAX_AGE=0):
+                category_index.children(0)
+            load.assert_called_once()
+
+
+class VerificationModeTest(SimpleTestCase):
+    @override_settings(OPENCART_VERIFICATION_MODE='off')
+    def test_off_skips_the_check(self):
+        check = mock.Mock(return_value=False)
+        self.assertIsNone(verify("skipped", check))
+        check.assert_not_called()
+
+    @override_settings(OPENCART_VERIFICATION_MODE='always')
+    def test_always_raises_on_failed_check(self):
+        self.assertTrue(verify("passes", lambda: True))
+        with self.assertRaises(VerificationError):
+            verify("fails", lambda: False)
+
+    @override_settings(OPENCART_VERIFICATION_MODE='sampled', OPENCART_VERIFICATION_SAMPLE_RATE=0.5)
+    def test_sampled_uses_the_sample_rate(self):
+        with mock.patch('myapp.verification.random.random', return_value=0.7):
+            self.assertIsNone(verify("not sampled", lambda: False))
+        with mock.patch('myapp.verification.random.random', return_value=0.2):
+            self.assertTrue(verify("sampled", lambda: True))
+
+
+class QueryProfilerTest(SimpleTestCase):
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM oc_product WHERE product_id IN (%s, %s, %s)"),
+            fingerprint("SELECT * FROM oc_product WHERE product_id IN (%s)")
+        )
+        self.assertEqual(
+            fingerprint("SELECT * FROM oc_cache WHERE `key` LIKE 'product%'"),
+            fingerprint("SELECT * FROM oc_cache WHERE `key` LIKE 'menu%'")
+        )
+
+    def test_profiler_reports_duplicates(self):
+        profiler = QueryProfiler()
+        execute = mock.Mock()
+        for product_id in range(3):
+            profiler(execute, "SELECT * FROM oc_product_image WHERE product_id = %s", [product_id], False, {})
+        profiler(execute, "SELECT * FROM oc_product", None, False, {})
+
+        self.assertEqual(profiler.count, 4)
+        self.assertEqual(profiler.duplicates, [("SELECT * FROM oc_product_image WHERE product_id = ?", 3)])
+
+
+class ArticleCommentTreeTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.article = Article.objects.create()
+        parent = None
+        # A single thread nested 30 replies deep
+        for i in range(30):
+            parent = ArticleComment.objects.create(
+                article=self.article, parent=parent, author=f"Author {i}", comment=f"Comment {i}"
+            )
+
+    def depth(self, comments):
+        depth = 0
+        while comments:
+            depth += 1
+            comments = comments[0]['replies']
+        return depth
+
+    def test_replies_are_loaded_one_query_per_level(self):
+        url = reverse('article-comments', kwargs={'pk': self.article.article_id})
+        # The article, the page of top-level comments and one query per reply level
+        with self.assertNumQueries(5):
+            response = self.client.get(url, {'max_depth': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.depth(response.data['results']), 4)
+
+    def test_max_depth_is_capped(self):
+        url = reverse('article-comments', kwargs={'pk': self.article.article_id})
+        with override_settings(OPENCART_COMMENT_MAX_DEPTH=5):
+            response = self.client.get(url, {'max_depth': 100})
+        self.assertEqual(self.depth(response.data['results']), 6)
+
+    def test_top_level_comments_are_paginated(self):
+        for i in range(3):
+            ArticleComment.objects.create(article=self.article, author="Other", comment=f"Top {i}", rating=i)
+        url = reverse('article-comments', kwargs={'pk': self.article.article_id})
+        response = self.client.get(url, {'limit': 2, 'ordering': '-rating'})
+        self.assertEqual([c['rating'] for c in response.data['results']], [2, 1])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+    def test_load_more_replies(self):
+        comment = ArticleComment.objects.get(comment="Comment 2")
+        url = reverse('article-comment-replies', kwargs={'pk': self.article.article_id, 'comment_id': comment.pk})
+        response = self.client.get(url, {'max_depth': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['comment'] for c in response.data['results']], ["Comment 3"])
+        self.assertEqual(self.depth(response.data['results']), 2)
+
+    def test_reply_updates_parent_counters(self):
+        parent = ArticleComment.objects.get(comment="Comment 29")
+        url = reverse('article-reply-to-comment', kwargs={'pk': self.article.article_id})
+        response = self.client.post(url, {
+            'parent_comment_id': parent.pk, 'author': "Replier", 'comment': "A reply"
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        parent.refresh_from_db()
+        self.assertEqual(parent.reply_count, 1)
+        self.assertIsNotNone(parent.last_reply_at)
+
+
+class ArticleFieldsetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.article = Article.objects.create(topic_id=1, author="Author")
+        ArticleComment.objects.create(article=self.article, author="Reader", comment="Hello")
+
+    def test_list_does_not_load_comments_unless_expanded(self):
+        # The articles and their descriptions
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('article-list'))
+        self.assertNotIn('comments', response.data[0])
+
+        response = self.client.get(reverse('article-list'), {'expand': 'comments'})
+        self.assertEqual(response.data[0]['comments'][0]['comment'], "Hello")
+
+    def test_fields_limits_the_response(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('article-list'), {'fields': 'article_id,author'})
+        self.assertEqual(response.data, [{'article_id': self.article.article_id, 'author': "Author"}])
+
+
+class DescriptionWriterTest(SimpleTestCase):
+    def test_upserts_all_languages_in_one_statement(self):
+        cursor = mock.Mock()
+        write_descriptions(cursor, ARTICLE_DESCRIPTIONS, [
+            (1, [{'language_id': 1, 'name': "One"}, {'language_id': 2, 'name': "Eins"}]),
+            (2, [{'language_id': 1, 'name': "Two"}]),
+        ], prune=True)
+
+        query, rows = cursor.executemany.call_args.args
+        self.assertIn("ON DUPLICATE KEY UPDATE", query)
+        self.assertEqual([row[:3] for row in rows], [[1, 1, "One"], [1, 2, "Eins"], [2, 1, "Two"]])
+
+        # Languages that were not supplied are removed with a single DELETE
+        query, params = cursor.execute.call_args.args
+        self.assertTrue(query.startswith("DELETE FROM oc_article_description"))
+        self.assertEqual(params, [1, 2, 1, 1, 1, 2, 2, 1])
+
+
+class TokenCacheTest(SimpleTestCase):
+    @override_settings(OPENCART_TOKEN_CACHE_SIZE=2)
+    def test_evicts_least_recently_used(self):
+        cache = TokenCache()
+        cache.set('a', (1,))
+        cache.set('b', (2,))
+        cache.get('a')
+        cache.set('c', (3,))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (1,))
+
+    @override_settings(OPENCART_TOKEN_CACHE_TTL=10)
+    def test_entries_expire(self):
+        cache = TokenCache()
+        with mock.patch('myapp.authentication.time.monotonic', return_value=100):
+            cache.set('a', (1,))
+        with mock.patch('myapp.authentication.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+
+
+class TokenAuthenticationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        token_cache.clear()
+        self.customer = Customer.objects.create(
+            firstname="Token", lastname="User", email="token@example.com",
+            telephone="123", password=make_password("secret"), token="a" * 40
+        )
+
+    def test_token_is_resolved_once(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.customer.token}")
+        response = self.client.get(reverse('address-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Only the address query once the token is cached
+        with self.assertNumQueries(1):
+            self.client.get(reverse('address-list'))
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + "b" * 40)
+        response = self.client.get(reverse('address-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_revokes_the_previous_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.customer.token}")
+        self.client.get(reverse('address-list'))
+
+        self.client.credentials()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('login'), {'email': "token@example.com", 'password': "secret"}, format='json')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.customer.token}")
+        response = self.client.get(reverse('address-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_customer_cannot_manage_api_clients(self):
+        Api.objects.create(username="pos", key="k" * 64)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.customer.token}")
+        self.assertEqual(self.client.get(reverse('api-list')).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(reverse('api-list'), {'username': "mine", 'key': "m" * 64}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PasswordHashingTest(SimpleTestCase):
+    def sha1(self, value):
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    def test_legacy_salted_sha1_is_upgraded(self):
+        salt = "abc123xyz"
+        encoded = self.sha1(salt + self.sha1(salt + self.sha1("secret")))
+        valid, new_encoded = verify_password("secret", encoded, salt)
+        self.assertTrue(valid)
+        self.assertTrue(new_encoded.startswith("pbkdf2_sha256$"))
+        self.assertEqual(verify_password("wrong", encoded, salt), (False, None))
+
+    def test_current_hash_is_not_rehashed(self):
+        self.assertEqual(verify_password("secret", make_password("secret")), (True, None))
+
+    @override_settings(OPENCART_PASSWORD_WORKERS=1)
+    def test_saturated_pool_refuses_work(self):
+        pool = PasswordPool()
+        pool._executor = mock.Mock()
+        pool._slots = threading.BoundedSemaphore(1)
+        pool._slots.acquire()
+        with self.assertRaises(PasswordPoolSaturated):
+            pool.run(make_password, "secret")
+        pool._executor.submit.assert_not_called()
+
+
+@override_settings(OPENCART_PASSWORD_WORKERS=0, OPENCART_LOGIN_FAILURE_LIMIT=2)
+class LoginTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.customer = Customer.objects.create(
+            firstname="Login", lastname="User", email="login@example.com",
+            telephone="123", password=hashlib.md5(b"secret").hexdigest()
+        )
+
+    def login(self, password):
+        return self.client.post(reverse('login'), {'email': "login@example.com", 'password': password}, format='json')
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        response = self.login("secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.customer.refresh_from_db()
+        self.assertTrue(self.customer.password.startswith("pbkdf2_sha256$"))
+
+    def test_repeated_failures_skip_hashing(self):
+        self.login("wrong")
+        self.login("wrong")
+        with mock.patch('myapp.serializers.check_customer_password') as check:
+            response = self.login("secret")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        check.assert_not_called()
+
+
+class CustomerExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(3):
+            customer = Customer.objects.create(
+                firstname=f"Export {i}", lastname="User", email=f"export{i}@example.com",
+                telephone="123", password="x"
+            )
+            Address.objects.create(
+                customer_id=customer.customer_id, firstname="Export", lastname="User",
+                address_1=f"{i} Main Street", city="Town", postcode="1000", country_id=1, zone_id=1
+            )
+
+    @override_settings(OPENCART_STREAM_CHUNK_SIZE=2)
+    def test_ndjson_export_joins_addresses_per_chunk(self):
+        response = self.client.get(reverse('customer-export'), {'stream': 'ndjson'})
+        # Two chunks, each one customer query and one address query
+        with self.assertNumQueries(4):
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(len(row['addresses']) == 1 for row in rows))
+        self.assertNotIn('password', rows[0])
+
+    def test_csv_export(self):
+        response = self.client.get(reverse('customer-export'))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('customer_id,'))
+        self.assertEqual(len(lines), 4)
+
+    def test_updated_since_filter(self):
+        response = self.client.get(reverse('customer-export'), {'stream': 'ndjson', 'updated_since': '2999-01-01'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        response = self.client.get(reverse('customer-export'), {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CustomerAddressTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(3):
+            self.customer = Customer.objects.create(
+                firstname=f"Address {i}", lastname="User", email=f"address{i}@example.com",
+                telephone="123", password="x"
+            )
+            for street in ("Main Street", "Side Street"):
+                Address.objects.create(
+                    customer_id=self.customer.customer_id, firstname="Address", lastname="User",
+                    address_1=street, city="Town", postcode="1000", country_id=1, zone_id=1
+                )
+
+    def test_list_loads_addresses_in_one_query(self):
+        # The customers and the addresses of all of them
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('customer-list'))
+        self.assertTrue(all(len(c['addresses']) == 2 for c in response.data))
+
+    def test_addresses_action(self):
+        url = reverse('customer-addresses', kwargs={'pk': self.customer.customer_id})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual([a['address_1'] for a in response.data], ["Main Street", "Side Street"])
+        self.assertEqual(response.data[0]['customer_id'], self.customer.customer_id)
+
+
+class CustomerSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Customer.objects.create(
+            firstname="Alice", lastname="Smith", email="alice@example.com", telephone="5550100", password="x"
+        )
+        Customer.objects.create(
+            firstname="Bob", lastname="Jones", email="bob@example.com", telephone="5559900", password="x"
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('customer-search'), {'q': query, 'fields': 'email'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [customer['email'] for customer in response.data]
+
+    def test_prefix_matches_each_field(self):
+        self.assertEqual(self.search("ali"), ["alice@example.com"])
+        self.assertEqual(self.search("Jon"), ["bob@example.com"])
+        self.assertEqual(self.search("Alice Sm"), ["alice@example.com"])
+        self.assertEqual(self.search("555"), ["alice@example.com", "bob@example.com"])
+
+    def test_like_wildcards_are_literal(self):
+        self.assertEqual(self.search("%"), [])
+
+    def test_query_is_required(self):
+        response = self.client.get(reverse('customer-search'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(OPENCART_API_HISTORY='sync')
+class ApiHistoryRecorderTest(SimpleTestCase):
+    def test_full_buffer_drops_the_oldest_calls(self):
+        recorder = ApiHistoryRecorder(capacity=2)
+        for call in ("GET a", "GET b", "GET c"):
+            recorder.record(1, call, "127.0.0.1")
+        stats = recorder.stats()
+        self.assertEqual((stats['recorded'], stats['dropped'], stats['pending']), (3, 1, 2))
+        self.assertEqual([entry[1] for entry in recorder._take()], ["GET b", "GET c"])
+
+    def test_calls_are_truncated_to_the_column(self):
+        recorder = ApiHistoryRecorder()
+        recorder.record(1, "GET " + "x" * 40, "127.0.0.1")
+        self.assertEqual(len(recorder._take()[0][1]), 32)
+
+
+@override_settings(OPENCART_API_HISTORY='sync')
+class ApiHistoryTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        api_key_cache.clear()
+        self.api = Api.objects.create(username="pos", key="k" * 64)
+        self.client.credentials(HTTP_X_API_KEY=self.api.key)
+
+    def test_api_key_requests_are_recorded(self):
+        response = self.client.get(reverse('api-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        entry = ApiHistory.objects.get(api=self.api)
+        self.assertEqual(entry.call, "GET api-list")
+        self.assertEqual(entry.ip, "127.0.0.1")
+
+    def test_api_key_is_not_a_customer(self):
+        self.assertEqual(self.client.get(reverse('address-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post(reverse('logout')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unknown_address_is_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ApiIp.objects.create(api=self.api, ip="10.0.0.1")
+            api_key_cache.discard_owner(self.api.api_id)
+        response = self.client.get(reverse('api-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_history_is_paginated(self):
+        ApiHistory.objects.bulk_create(
+            ApiHistory(api=self.api, call=f"GET {i}", ip="127.0.0.1") for i in range(3)
+        )
+        response = self.client.get(reverse('api-history', args=[self.api.api_id]), {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry['call'] for entry in response.data['results']], ["GET 2", "GET 1"])
+        self.assertIsNotNone(response.data['next'])
+
+
+class CategoryTreeTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def create_category(self, name, parent_id=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('category-create'), {
+                'name': name, 'parent_id': parent_id, 'stores': [{'store_id': 0}]
+            }, format='json')
+        return response.data['category_id']
+
+    def test_tree_is_nested_and_revalidated(self):
+        parent_id = self.create_category("Parent")
+        child_id = self.create_category("Child", parent_id)
+
+        response = self.client.get(reverse('category-tree'), {'store_id': 0, 'language_id': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        categories = json.loads(response.content)['categories']
+        self.assertEqual(categories[0]['category_id'], parent_id)
+        self.assertEqual(categories[0]['children'][0]['path'], f"{parent_id}_{child_id}")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse('category-tree'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        weak = self.client.get(reverse('category-tree'), HTTP_IF_NONE_MATCH=f"W/{response['ETag']}")
+        self.assertEqual(weak.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(reverse('category-tree'), HTTP_IF_NONE_MATCH='*').status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.create_category("Sibling")
+        rebuilt = self.client.get(reverse('category-tree'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(rebuilt.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(rebuilt.content)['categories']), 2)
+
+
+class CategoryForestTest(SimpleTestCase):
+    def test_nested_and_referenced_nodes_are_ordered_parents_first(self):
+        nodes = order_forest(flatten_forest([
+            {'key': 'shoes', 'name': "Shoes", 'parent_key': 'men'},
+            {'key': 'men', 'name': "Men", 'children': [{'name': "Shirts"}]},
+        ]))
+        self.assertEqual([node['key'] for node in nodes], ['men', 'shoes', 'men.0'])
+        self.assertEqual(nodes[2]['parent_key'], 'men')
+
+    def test_cycles_and_unknown_parents_are_rejected(self):
+        with self.assertRaises(ForestError) as cycle:
+            order_forest(flatten_forest([
+                {'key': 'a', 'parent_key': 'b'}, {'key': 'b', 'parent_key': 'a'}, {'key': 'c'}
+            ]))
+        self.assertEqual({error['key'] for error in cycle.exception.errors}, {'a', 'b'})
+
+        with self.assertRaises(ForestError) as unknown:
+            order_forest(flatten_forest([{'key': 'a', 'parent_key': 'missing'}]))
+        self.assertEqual(unknown.exception.errors[0]['key'], 'a')
+
+
+@override_settings(OPENCART_VERIFICATION_MODE='off')
+class CategoryBulkTest(TestCase):
+    def test_forest_is_created_with_paths(self):
+        client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('category-bulk'), [
+                {'key': 'root', 'name': "Root", 'stores': [{'store_id': 0}], 'children': [
+                    {'key': 'child', 'name': "Child", 'children': [{'key': 'leaf', 'name': "Leaf"}]},
+                ]},
+                {'key': 'sibling', 'name': "Sibling", 'parent_key': 'child'},
+            ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('verification', response.data)
+        ids = response.data['categories']
+        self.assertEqual(category_index.ancestors(ids['leaf']), [ids['root'], ids['child']])
+        self.assertEqual(category_index.parent(ids['sibling']), ids['child'])
+
+    def test_deleted_ids_are_not_reused(self):
+        client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = client.post(reverse('category-bulk'), [{'key': 'a', 'name': "A"}], format='json')
+            deleted_id = first.data['categories']['a']
+            client.delete(reverse('category-delete', args=[deleted_id]))
+            second = client.post(reverse('category-bulk'), [{'key': 'b', 'name': "B"}], format='json')
+        self.assertGreater(second.data['categories']['b'], deleted_id)
+
+    def test_invalid_node_writes_nothing(self):
+        response = APIClient().post(reverse('category-bulk'), [
+            {'key': 'root', 'name': "Root", 'children': [{'key': 'child'}]},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0]['key'], 'child')
+
+
+class CategorySubtreeTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('category-bulk'), [
+                {'key': 'a', 'name': "A", 'children': [
+                    {'key': 'b', 'name': "B", 'children': [{'key': 'c', 'name': "C"}]},
+                ]},
+                {'key': 'd', 'name': "D"},
+            ], format='json')
+        self.ids = response.data['categories']
+
+    def test_move_rewrites_subtree_paths(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('category-move', args=[self.ids['b']]), {'parent_id': self.ids['d']}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(category_index.ancestors(self.ids['c']), [self.ids['d'], self.ids['b']])
+        self.assertEqual(
+            [level for _, level in category_index.path(self.ids['c'])], [1, 2, 3]
+        )
+
+    def test_move_unlinks_products_from_old_ancestors(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = self.client.post(reverse('category-create'), {'name': "E", 'parent_id': self.ids['a']}, format='json')
+        e = other.data['category_id']
+        ProductToCategory.objects.bulk_create(
+            [ProductToCategory(product_id=9001, category_id=self.ids[key]) for key in 'abc'] +
+            [ProductToCategory(product_id=9002, category_id=category_id)
+             for category_id in (self.ids['a'], self.ids['b'], self.ids['c'], e)]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('category-move', args=[self.ids['b']]), {'parent_id': self.ids['d']}, format='json')
+
+        def linked(product_id):
+            return set(ProductToCategory.objects.filter(product_id=product_id).values_list('category_id', flat=True))
+        self.assertEqual(linked(9001), {self.ids['b'], self.ids['c'], self.ids['d']})
+        # Still under A through E
+        self.assertEqual(linked(9002), {self.ids['a'], self.ids['b'], self.ids['c'], self.ids['d'], e})
+
+    def test_move_below_itself_is_rejected(self):
+        response = self.client.post(
+            reverse('category-move', args=[self.ids['a']]), {'parent_id': self.ids['c']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_subtree_delete_removes_every_row(self):
+        response = self.client.delete(reverse('category-delete', args=[self.ids['a']]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.delete(reverse('category-delete', args=[self.ids['a']]) + '?subtree=true')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['details']['category_rows_deleted'], 3)
+        subtree = [self.ids['a'], self.ids['b'], self.ids['c']]
+        self.assertFalse(CategoryPath.objects.filter(category_id__in=subtree).exists())
+
+
+class ProductCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        product_cache.backend.clear()
+        self.product = Product.objects.create(
+            model="CACHE-1", quantity=5, price=10, stock_status_id=7, manufacturer_id=1, tax_class_id=9
+        )
+        self.url = reverse('product-detail', args=[self.product.product_id])
+
+    def test_detail_is_served_from_cache_until_invalidated(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        hits = product_cache.stats()['hits']
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(product_cache.stats()['hits'], hits + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('product-stock'), [
+                {'product_id': self.product.product_id, 'quantity': 7}
+            ], format='json')
+        self.assertEqual(json.loads(self.client.get(self.url).content)['quantity'], 7)
+
+    def test_conditional_requests_get_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+
+class ProductFilterTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        required = {'stock_status_id': 7, 'tax_class_id': 9}
+        Product.objects.create(model="CHEAP", price=5, manufacturer_id=1, **required)
+        Product.objects.create(model="MID", price=20, manufacturer_id=2, **required)
+        Product.objects.create(model="DEAR", price=50, manufacturer_id=2, status=False, **required)
+
+    def models(self, **params):
+        response = self.client.get(reverse('product-list'), dict(params, fields='model'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['model'] for product in response.data['results']]
+
+    def test_filters_combine(self):
+        self.assertEqual(self.models(manufacturer_id=2, status=1), ["MID"])
+        self.assertEqual(self.models(price_min=10, price_max=60), ["MID", "DEAR"])
+
+    def test_ordering_pages_with_a_tie_breaker(self):
+        self.assertEqual(self.models(ordering='-price'), ["DEAR", "MID", "CHEAP"])
+        Product.objects.create(model="MID2", price=20, stock_status_id=7, tax_class_id=9, manufacturer_id=2)
+        response = self.client.get(reverse('product-list'), {'ordering': 'price', 'limit': 2, 'fields': 'model'})
+        following = self.client.get(response.data['next'])
+        self.assertEqual([product['model'] for product in following.data['results']], ["MID2", "DEAR"])
+        previous = self.client.get(following.data['previous'])
+        self.assertEqual([product['model'] for product in previous.data['results']], ["CHEAP", "MID"])
+
+    def test_malformed_filter_is_rejected(self):
+        response = self.client.get(reverse('product-list'), {'price_min': 'cheap'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_values_are_validated(self):
+        with self.assertRaises(ProductFilterError):
+            filter_products(Product.objects.all(), {'modified_since': 'yesterday'})
+
+
+class ProductIndexAdvisorTest(SimpleTestCase):
+    def test_leading_columns_cover_an_index(self):
+        constraints = {
+            'PRIMARY': {'columns': ['product_id', 'category_id'], 'primary_key': True, 'unique': True, 'index': True},
+            'category_id': {'columns': ['category_id', 'product_id'], 'primary_key': False, 'unique': False, 'index': True},
+        }
+        self.assertEqual(covering_index(constraints, ('category_id',)), 'category_id')
+        self.assertIsNone(covering_index(constraints, ('product_id', 'store_id')))
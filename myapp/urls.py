@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CustomerViewSet, AddressViewSet, ArticleViewSet, ApiViewSet,
-    RegisterAPI, LoginAPI, CategoryCreateAPI, CategoryDeleteAPI, ProductAPI
+    RegisterAPI, LoginAPI, LogoutAPI, CategoryCreateAPI, CategoryBulkAPI, CategoryDeleteAPI, CategoryMoveAPI, CategoryTreeAPI, ProductAPI,
+    ProductBulkAPI, ProductStockAPI, QueryMetricsAPI
 )
 
 router = DefaultRouter()
@@ -14,9 +15,16 @@ router.register(r'apis', ApiViewSet)
 urlpatterns = [
     path('register/', RegisterAPI.as_view(), name='register'),
     path('login/', LoginAPI.as_view(), name='login'),
+    path('logout/', LogoutAPI.as_view(), name='logout'),
     path('categories/', CategoryCreateAPI.as_view(), name='category-create'),
+    path('categories/bulk/', CategoryBulkAPI.as_view(), name='category-bulk'),
+    path('categories/tree/', CategoryTreeAPI.as_view(), name='category-tree'),
     path('categories/<int:category_id>/', CategoryDeleteAPI.as_view(), name='category-delete'),
+    path('categories/<int:category_id>/move/', CategoryMoveAPI.as_view(), name='category-move'),
     path('products/', ProductAPI.as_view(), name='product-list'),
+    path('products/bulk/', ProductBulkAPI.as_view(), name='product-bulk'),
+    path('products/stock/', ProductStockAPI.as_view(), name='product-stock'),
     path('products/<int:product_id>/', ProductAPI.as_view(), name='product-detail'),
+    path('_metrics', QueryMetricsAPI.as_view(), name='query-metrics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,51 @@
+import logging
+import random
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+VERIFICATION_MODES = ('off', 'sampled', 'always')
+
+
+class VerificationError(Exception):
+    pass
+
+
+def get_verification_mode():
+    mode = getattr(settings, 'OPENCART_VERIFICATION_MODE', 'off')
+    if mode not in VERIFICATION_MODES:
+        logger.warning(f"Unknown OPENCART_VERIFICATION_MODE '{mode}', treating it as 'off'")
+        return 'off'
+    return mode
+
+
+def should_verify():
+    """
+    Whether the current write should read back what it wrote.
+
+    'always' verifies every write, 'sampled' a fraction of them
+    (OPENCART_VERIFICATION_SAMPLE_RATE) and 'off' none.
+    """
+    mode = get_verification_mode()
+    if mode == 'always':
+        return True
+    if mode == 'sampled':
+        return random.random() < getattr(settings, 'OPENCART_VERIFICATION_SAMPLE_RATE', 0.01)
+    return False
+
+
+def verify(label, check):
+    """
+    Run `check` if this write is selected for verification.
+
+    `check` returns a truthy value when the write looks right. Returns True
+    when verified, None when skipped; raises VerificationError on failure.
+    """
+    if not should_verify():
+        return None
+    if not check():
+        logger.error(f"Write verification failed: {label}")
+        raise VerificationError(f"Verification failed: {label}")
+    logger.info(f"Write verified: {label}")
+    return True
@@ -2,17 +2,22 @@ from django.shortcuts import render
 # Create your views here.
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 from django.utils.crypto import get_random_string
-from .models import Customer, Category, CategoryDescription, Product
-from .serializers import CustomerRegisterSerializer, CustomerLoginSerializer, CategorySerializer, ProductSerializer
+from .models import Customer, Category, CategoryDescription, CategoryPath, Product, ProductToStore
+from .serializers import CustomerRegisterSerializer, CustomerLoginSerializer, CategorySerializer, ProductSerializer, ProductStockSerializer
 import logging
 from django.db import transaction, connection
+from django.conf import settings
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.http import HttpResponse
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import Throttled
 from django.shortcuts import get_object_or_404
 from .models import (
     Customer, Address, Article, ArticleDescription,
@@ -25,7 +30,32 @@ from .serializers import (
 )
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
-import os
+from .pagination import ApiHistoryCursorPagination, CommentCursorPagination, ProductCursorPagination
+from .schema import table_exists
+from .cache_invalidation import (
+    invalidate_cache_tags, CATEGORY_WRITE_TAGS, PRODUCT_WRITE_TAGS, PRODUCT_DELETE_TAGS
+)
+from .streaming import EXPORT_FORMATS, STREAM_FORMATS, iter_keyset_chunks, streaming_response
+from .loaders import CUSTOMER_RELATIONS, fetch_grouped, load_customer_relations
+from .category_index import category_index, invalidate_category_index
+from .category_forest import (
+    ForestError, delete_category_subtree, flatten_forest, move_category_subtree, order_forest,
+    write_category_forest
+)
+from .category_tree import get_tree_snapshot
+from .product_cache import invalidate_products, product_cache, product_variant
+from .product_filters import ProductFilterError, filter_products, parse_since
+from .api_history import api_history_recorder
+from .authentication import ApiKeyAuthentication, invalidate_api_keys, invalidate_customer_tokens
+from .permissions import IsApiClient, IsCustomer
+from .search import search_customers
+from .comments import CommentTree, record_reply
+from .descriptions import PRODUCT_DESCRIPTIONS, write_descriptions
+from .parsers import NDJSONParser
+from .reconcile import PRODUCT_CHILD_TABLES, reconcile_children
+from .profiling import query_metrics
+from .verification import VerificationError, verify
+from .writers import chunked, get_bulk_chunk_size, insert_returning_ids, insert_rows
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +76,7 @@ class LoginAPI(APIView):
 
     def post(self, request):
         try:
-            serializer = CustomerLoginSerializer(data=request.data)
+            serializer = CustomerLoginSerializer(data=request.data, context={'request': request})
             if serializer.is_valid():
                 user = serializer.validated_data
                 
@@ -61,13 +91,17 @@ class LoginAPI(APIView):
                             SET token = %s
                             WHERE customer_id = %s
                         """, [new_token, user.customer_id])
+                    # Drop the previous token from the authentication cache
+                    invalidate_customer_tokens(user.customer_id)
                 
                 # Verify token was saved
-                saved_user = Customer.objects.get(email=user.email)
-                logger.info(f"Token saved for user {saved_user.email}: {saved_user.token}")
-                
-                if saved_user.token != new_token:
-                    logger.error(f"Token mismatch! Generated: {new_token}, Saved: {saved_user.token}")
+                try:
+                    verify(
+                        f"token saved for customer {user.customer_id}",
+                        lambda: Customer.objects.filter(customer_id=user.customer_id, token=new_token).exists()
+                    )
+                except VerificationError:
+                    logger.error(f"Token mismatch for customer {user.customer_id}")
                     return Response({
                         'message': 'Login successful but token verification failed',
                         'token': new_token
@@ -85,6 +119,9 @@ class LoginAPI(APIView):
                     }
                 })
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        except Throttled:
+            # Saturated password workers or too many failures: 429
+            raise
         except Exception as e:
             logger.error(f"Login error: {str(e)}")
             return Response({
@@ -92,73 +129,21 @@ class LoginAPI(APIView):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class CategoryCreateAPI(APIView):
-    permission_classes = [AllowAny]
+class LogoutAPI(APIView):
+    permission_classes = [IsCustomer]
 
-    def clear_opencart_cache(self):
-        try:
+    def post(self, request):
+        with transaction.atomic():
             with connection.cursor() as cursor:
-                # Check which cache tables exist
-                cache_tables = {
-                    'cache': self.table_exists(cursor, 'oc_cache'),
-                    'modification': self.table_exists(cursor, 'oc_modification'),
-                    'category_image_cache': self.table_exists(cursor, 'oc_category_image_cache'),
-                    'setting': self.table_exists(cursor, 'oc_setting')
-                }
-                
-                # Clear all category-related caches from database if table exists
-                if cache_tables['cache']:
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'category%'")
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'menu%'")
-                
-                # Clear modification cache if table exists
-                if cache_tables['modification']:
-                    cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'category%'")
-                
-                # Clear image cache if exists
-                if cache_tables['category_image_cache']:
-                    cursor.execute("DELETE FROM oc_category_image_cache")
-                
-                # Refresh modification cache if setting table exists
-                if cache_tables['setting']:
-                    cursor.execute("UPDATE oc_setting SET value = NOW() WHERE `key` = 'config_modification'")
-                
-                # Clear storage cache directories if they exist
-                cache_dirs = [
-                    'system/storage/cache/',
-                    'system/storage/modification/',
-                    'image/cache/'
-                ]
-                
-                for cache_dir in cache_dirs:
-                    try:
-                        if os.path.exists(cache_dir):
-                            for file in os.listdir(cache_dir):
-                                file_path = os.path.join(cache_dir, file)
-                                try:
-                                    if os.path.isfile(file_path):
-                                        os.unlink(file_path)
-                                except Exception as e:
-                                    logger.warning(f"Error clearing cache directory {cache_dir}: {str(e)}")
-                    except Exception as e:
-                        logger.warning(f"Error accessing cache directory {cache_dir}: {str(e)}")
-                        continue
-                
-                logger.info("OpenCart cache cleared successfully")
-        except Exception as e:
-            logger.error(f"Error clearing cache: {str(e)}")
-            # Don't raise the error since cache clearing is not critical
-            # The category creation should continue even if cache clearing fails
-            pass
-
-    def table_exists(self, cursor, table_name):
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM information_schema.tables 
-            WHERE table_schema = DATABASE()
-            AND table_name = %s
-        """, [table_name])
-        return cursor.fetchone()[0] > 0
+                cursor.execute(
+                    "UPDATE oc_customer SET token = '' WHERE customer_id = %s", [request.user.customer_id]
+                )
+            invalidate_customer_tokens(request.user.customer_id)
+        return Response({'message': 'Logout successful'})
+
+class CategoryCreateAPI(APIView):
+    authentication_classes = [ApiKeyAuthentication]
+    permission_classes = [AllowAny]
 
     def get(self, request):
         # Add GET method to check table structure
@@ -191,151 +176,35 @@ class CategoryCreateAPI(APIView):
                 
                 with transaction.atomic():
                     with connection.cursor() as cursor:
-                        # First verify we can read from the table
-                        cursor.execute("SELECT COUNT(*) FROM oc_category")
-                        count = cursor.fetchone()[0]
-                        logger.info(f"Current count in oc_category: {count}")
-
-                        # Insert into oc_category with explicit column names
-                        insert_query = """
-                            INSERT INTO oc_category 
-                            (image, parent_id, `column`, sort_order, status, date_added, date_modified)
-                            VALUES (%s, %s, %s, %s, %s, NOW(), NOW())
-                        """
-                        params = [
-                            serializer.validated_data.get('image', ''),
-                            serializer.validated_data.get('parent_id', 0),
-                            serializer.validated_data.get('column', 1),
-                            serializer.validated_data.get('sort_order', 0),
-                            serializer.validated_data.get('status', 1)
-                        ]
-                        logger.info(f"Executing insert query: {insert_query} with params: {params}")
-                        cursor.execute(insert_query, params)
-                        
-                        # Verify the insert by getting the last ID
-                        cursor.execute("SELECT LAST_INSERT_ID()")
-                        category_id = cursor.fetchone()[0]
+                        category_id = write_category_forest(
+                            cursor, [('new', None, serializer.validated_data)]
+                        )['new']
                         logger.info(f"Got category_id: {category_id}")
 
                         # Verify the row was actually inserted
-                        cursor.execute("SELECT * FROM oc_category WHERE category_id = %s", [category_id])
-                        inserted_row = cursor.fetchone()
-                        logger.info(f"Inserted row data: {inserted_row}")
-
-                        if not inserted_row:
-                            raise Exception("Row was not actually inserted despite no error")
-
-                        # Now insert the description
-                        desc_query = """
-                            INSERT INTO oc_category_description 
-                            (category_id, language_id, name, description, meta_title, meta_description, meta_keyword)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """
-                        desc_params = [
-                            category_id,
-                            serializer.validated_data.get('language_id', 1),
-                            serializer.validated_data.get('name', ''),
-                            serializer.validated_data.get('description', ''),
-                            serializer.validated_data.get('meta_title', ''),
-                            serializer.validated_data.get('meta_description', ''),
-                            serializer.validated_data.get('meta_keyword', '')
-                        ]
-                        logger.info(f"Executing description insert: {desc_query} with params: {desc_params}")
-                        cursor.execute(desc_query, desc_params)
-
-                        # Handle category path
-                        parent_id = serializer.validated_data.get('parent_id', 0)
-                        if parent_id > 0:
-                            # Get parent category paths
-                            cursor.execute("""
-                                SELECT path_id, level 
-                                FROM oc_category_path 
-                                WHERE category_id = %s
-                            """, [parent_id])
-                            parent_paths = cursor.fetchall()
-                            
-                            # Insert paths for the new category
-                            for parent_path in parent_paths:
-                                cursor.execute("""
-                                    INSERT INTO oc_category_path 
-                                    (category_id, path_id, level)
-                                    VALUES (%s, %s, %s)
-                                """, [category_id, parent_path[0], parent_path[1]])
-                            
-                            # Add the new category's own path
-                            cursor.execute("""
-                                INSERT INTO oc_category_path 
-                                (category_id, path_id, level)
-                                VALUES (%s, %s, %s)
-                            """, [category_id, category_id, len(parent_paths) + 1])
-                        else:
-                            # For root categories, just add their own path
-                            cursor.execute("""
-                                INSERT INTO oc_category_path 
-                                (category_id, path_id, level)
-                                VALUES (%s, %s, %s)
-                            """, [category_id, category_id, 1])
-
-                        # Insert filters if provided
-                        filters_data = serializer.validated_data.get('filters', [])
-                        if filters_data:
-                            filter_query = """
-                                INSERT INTO oc_category_filter (category_id, filter_id)
-                                VALUES (%s, %s)
-                            """
-                            for filter_data in filters_data:
-                                cursor.execute(filter_query, [category_id, filter_data['filter_id']])
-
-                        # Insert layouts if provided
-                        layouts_data = serializer.validated_data.get('layouts', [])
-                        if layouts_data:
-                            layout_query = """
-                                INSERT INTO oc_category_to_layout (category_id, store_id, layout_id)
-                                VALUES (%s, %s, %s)
-                            """
-                            for layout_data in layouts_data:
-                                cursor.execute(layout_query, [
-                                    category_id,
-                                    layout_data['store_id'],
-                                    layout_data.get('layout_id', 0)
-                                ])
+                        verified = verify(
+                            f"category {category_id} inserted",
+                            lambda: Category.objects.filter(category_id=category_id).exists()
+                        )
 
-                        # Insert stores if provided
-                        stores_data = serializer.validated_data.get('stores', [])
-                        if stores_data:
-                            store_query = """
-                                INSERT INTO oc_category_to_store (category_id, store_id)
-                                VALUES (%s, %s)
-                            """
-                            for store_data in stores_data:
-                                cursor.execute(store_query, [category_id, store_data['store_id']])
-
-                        # Insert coupons if provided
-                        coupons_data = serializer.validated_data.get('coupons', [])
-                        if coupons_data:
-                            coupon_query = """
-                                INSERT INTO oc_coupon_category (category_id, coupon_id)
-                                VALUES (%s, %s)
-                            """
-                            for coupon_data in coupons_data:
-                                cursor.execute(coupon_query, [category_id, coupon_data['coupon_id']])
-
-                        # Commit the transaction explicitly
-                        cursor.execute("COMMIT")
-                        
-                        # Clear OpenCart cache to reflect changes
-                        self.clear_opencart_cache()
+                        # Clear OpenCart cache and the category index to reflect changes
+                        invalidate_cache_tags(*CATEGORY_WRITE_TAGS)
+                        invalidate_category_index()
                         
-                        return Response({
+                        data = {
                             'message': 'Category created successfully',
                             'category_id': category_id,
                             'status': serializer.validated_data.get('status', 1),
-                            'parent_id': serializer.validated_data.get('parent_id', 0),
-                            'verification': inserted_row is not None
-                        })
+                            'parent_id': serializer.validated_data.get('parent_id', 0)
+                        }
+                        if verified is not None:
+                            data['verification'] = verified
+                        return Response(data)
             
             logger.error(f"Validation failed: {serializer.errors}")
             return Response(serializer.errors, status=400)
+        except ForestError as e:
+            return Response({'message': 'Error creating category', 'errors': e.errors}, status=400)
         except Exception as e:
             logger.error(f"Error creating category: {str(e)}")
             return Response({
@@ -343,7 +212,85 @@ class CategoryCreateAPI(APIView):
                 'error': str(e)
             }, status=500)
 
+class CategoryBulkAPI(APIView):
+    authentication_classes = [ApiKeyAuthentication]
+    permission_classes = [AllowAny]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request):
+        """
+        Create a forest of categories in one transaction.
+
+        Children are given either nested under `children` or as separate
+        nodes naming their parent's client `key` in `parent_key`; top-level
+        nodes may hang under an existing category through `parent_id`.
+        Nothing is written unless every node is valid.
+        """
+        try:
+            nodes = order_forest(flatten_forest(request.data))
+        except ForestError as e:
+            return Response({'message': 'Error creating categories', 'errors': e.errors}, status=400)
+
+        validator = CategorySerializer()
+        planned, errors = [], []
+        for node in nodes:
+            try:
+                planned.append((node['key'], node.get('parent_key'), validator.run_validation(node)))
+            except serializers.ValidationError as e:
+                errors.append({'key': node['key'], 'errors': e.detail})
+        if errors:
+            return Response({'message': 'Error creating categories', 'errors': errors}, status=400)
+
+        try:
+            logger.info(f"Bulk creating {len(planned)} categories")
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    category_ids = write_category_forest(cursor, planned)
+                first, last = min(category_ids.values()), max(category_ids.values())
+                verified = verify(
+                    f"{len(category_ids)} categories inserted",
+                    lambda: Category.objects.filter(
+                        category_id__gte=first, category_id__lte=last
+                    ).count() == len(category_ids)
+                )
+                invalidate_cache_tags(*CATEGORY_WRITE_TAGS)
+                invalidate_category_index()
+            data = {
+                'message': 'Categories created successfully',
+                'created_count': len(category_ids),
+                'categories': category_ids
+            }
+            if verified is not None:
+                data['verification'] = verified
+            return Response(data, status=status.HTTP_201_CREATED)
+        except ForestError as e:
+            return Response({'message': 'Error creating categories', 'errors': e.errors}, status=400)
+        except Exception as e:
+            logger.error(f"Error bulk creating categories: {str(e)}")
+            return Response({
+                'message': 'Error creating categories',
+                'error': str(e)
+            }, status=500)
+
+class CategoryTreeAPI(APIView):
+    permission_classes = [AllowAny]
+    query_budget = {'GET': 2}
+
+    def get(self, request):
+        try:
+            store_id = int(request.query_params.get('store_id', 0))
+            language_id = int(request.query_params.get('language_id', 1))
+        except ValueError:
+            return Response({'error': 'store_id and language_id must be integers'}, status=400)
+
+        snapshot = get_tree_snapshot(store_id, language_id)
+        response = HttpResponse(snapshot.content, content_type='application/json')
+        response['ETag'] = snapshot.etag
+        response['Cache-Control'] = 'no-cache'
+        return get_conditional_response(request, etag=snapshot.etag, response=response)
+
 class CategoryDeleteAPI(APIView):
+    authentication_classes = [ApiKeyAuthentication]
     permission_classes = [AllowAny]
 
     def delete(self, request, category_id):
@@ -367,47 +314,35 @@ class CategoryDeleteAPI(APIView):
                     # Check for child categories
                     cursor.execute("SELECT COUNT(*) FROM oc_category WHERE parent_id = %s", [category_id])
                     child_count = cursor.fetchone()[0]
-                    if child_count > 0:
+                    subtree = request.query_params.get('subtree', '').lower() in ('1', 'true')
+                    if child_count > 0 and not subtree:
                         logger.warning(f"Category {category_id} has {child_count} child categories")
                         return Response({
                             'message': 'Error deleting category',
-                            'error': f'Cannot delete category {category_id} because it has {child_count} child categories'
+                            'error': f'Cannot delete category {category_id} because it has {child_count} child categories; '
+                                     f'pass ?subtree=true to delete them as well'
                         }, status=400)
                     
                     try:
-                        # Delete from oc_category_description first
-                        cursor.execute("DELETE FROM oc_category_description WHERE category_id = %s", [category_id])
-                        desc_rows_deleted = cursor.rowcount
-                        logger.info(f"Deleted {desc_rows_deleted} rows from oc_category_description")
-                        
-                        # Check for any other related tables that might have foreign keys
-                        cursor.execute("""
-                            SELECT COUNT(*) 
-                            FROM information_schema.KEY_COLUMN_USAGE 
-                            WHERE REFERENCED_TABLE_NAME = 'oc_category' 
-                            AND TABLE_SCHEMA = DATABASE()
-                        """)
-                        fk_count = cursor.fetchone()[0]
-                        logger.info(f"Found {fk_count} foreign key relationships to oc_category")
-                        
-                        # Then delete from oc_category
-                        cursor.execute("DELETE FROM oc_category WHERE category_id = %s", [category_id])
-                        cat_rows_deleted = cursor.rowcount
-                        logger.info(f"Deleted {cat_rows_deleted} rows from oc_category")
+                        # The category, its descendants and all their rows
+                        deleted = delete_category_subtree(cursor, category_id)
+                        logger.info(f"Deleted category subtree {category_id}: {deleted}")
+                        invalidate_cache_tags(*CATEGORY_WRITE_TAGS)
+                        invalidate_category_index()
                         
                         # Verify deletion
-                        cursor.execute("SELECT COUNT(*) FROM oc_category WHERE category_id = %s", [category_id])
-                        remaining = cursor.fetchone()[0]
-                        if remaining > 0:
-                            logger.error(f"Category {category_id} still exists after deletion")
-                            raise Exception("Category was not deleted successfully")
+                        verify(
+                            f"category {category_id} deleted",
+                            lambda: not Category.objects.filter(category_id=category_id).exists()
+                        )
                         
                         return Response({
                             'message': 'Category deleted successfully',
                             'category_id': category_id,
                             'details': {
-                                'category_rows_deleted': cat_rows_deleted,
-                                'description_rows_deleted': desc_rows_deleted
+                                'category_rows_deleted': deleted['oc_category'],
+                                'description_rows_deleted': deleted['oc_category_description'],
+                                'rows_deleted': deleted
                             }
                         })
                     except Exception as e:
@@ -424,86 +359,80 @@ class CategoryDeleteAPI(APIView):
                 'category_id': category_id
             }, status=500)
 
-class ProductAPI(APIView):
+class CategoryMoveAPI(APIView):
+    authentication_classes = [ApiKeyAuthentication]
     permission_classes = [AllowAny]
 
-    def clear_opencart_cache(self):
+    def post(self, request, category_id):
+        """Move a category with its whole subtree under `parent_id` (0 for the top level)."""
         try:
-            with connection.cursor() as cursor:
-                # Check which cache tables exist
-                cache_tables = {
-                    'cache': self.table_exists(cursor, 'oc_cache'),
-                    'modification': self.table_exists(cursor, 'oc_modification'),
-                    'product_image_cache': self.table_exists(cursor, 'oc_product_image_cache'),
-                    'setting': self.table_exists(cursor, 'oc_setting')
-                }
-                
-                # Clear all product-related caches from database if table exists
-                if cache_tables['cache']:
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'product%'")
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'category%'")
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'manufacturer%'")
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'information%'")
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'menu%'")
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'store%'")
-                    cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'admin%'")  # Clear admin cache
-                
-                # Clear modification cache if table exists
-                if cache_tables['modification']:
-                    cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'product%'")
-                    cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'category%'")
-                    cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'store%'")
-                    cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'admin%'")  # Clear admin modifications
-                
-                # Clear image cache if exists
-                if cache_tables['product_image_cache']:
-                    cursor.execute("DELETE FROM oc_product_image_cache")
-                
-                # Refresh modification cache if setting table exists
-                if cache_tables['setting']:
-                    cursor.execute("UPDATE oc_setting SET value = NOW() WHERE `key` = 'config_modification'")
-                
-                # Clear storage cache directories if they exist
-                cache_dirs = [
-                    'system/storage/cache/',
-                    'system/storage/modification/',
-                    'image/cache/',
-                    'admin/storage/cache/',  # Clear admin cache directory
-                    'admin/storage/modification/'  # Clear admin modification directory
-                ]
-                
-                for cache_dir in cache_dirs:
-                    try:
-                        if os.path.exists(cache_dir):
-                            for file in os.listdir(cache_dir):
-                                file_path = os.path.join(cache_dir, file)
-                                try:
-                                    if os.path.isfile(file_path):
-                                        os.unlink(file_path)
-                                except Exception as e:
-                                    logger.warning(f"Error clearing cache directory {cache_dir}: {str(e)}")
-                    except Exception as e:
-                        logger.warning(f"Error accessing cache directory {cache_dir}: {str(e)}")
-                        continue
-                
-                logger.info("OpenCart cache cleared successfully")
+            parent_id = int(request.data.get('parent_id', 0))
+        except (TypeError, ValueError):
+            return Response({'message': 'Error moving category', 'error': 'parent_id must be an integer'}, status=400)
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    move_category_subtree(cursor, category_id, parent_id)
+                verify(
+                    f"category {category_id} moved",
+                    lambda: category_path_contains(category_id, parent_id)
+                )
+                invalidate_cache_tags(*CATEGORY_WRITE_TAGS)
+                invalidate_category_index()
+            logger.info(f"Moved category {category_id} under {parent_id}")
+            return Response({
+                'message': 'Category moved successfully',
+                'category_id': category_id,
+                'parent_id': parent_id
+            })
+        except ForestError as e:
+            return Response({'message': 'Error moving category', 'errors': e.errors}, status=400)
         except Exception as e:
-            logger.error(f"Error clearing cache: {str(e)}")
-            pass
+            logger.error(f"Error moving category {category_id}: {str(e)}")
+            return Response({
+                'message': 'Error moving category',
+                'error': str(e),
+                'category_id': category_id
+            }, status=500)
+
+def category_path_contains(category_id, path_id):
+    """Whether oc_category_path places `category_id` below `path_id` (0: always)."""
+    return not path_id or CategoryPath.objects.filter(category_id=category_id, path_id=path_id).exists()
+
+def get_store_ids():
+    if not table_exists('oc_store'):
+        return [0]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT store_id FROM oc_store")
+        stores = [row[0] for row in cursor.fetchall()]
+    # If no stores found, add to store 0 (default store)
+    return stores or [0]
+
+class ProductAPI(APIView):
+    authentication_classes = [ApiKeyAuthentication]
+    permission_classes = [AllowAny]
+    query_budget = {'GET': 5}
 
     def get(self, request, product_id=None):
         try:
-            response = None
             if product_id:
-                # Get specific product
-                product = Product.objects.get(product_id=product_id)
-                serializer = ProductSerializer(product)
-                response = Response(serializer.data)
-            else:
-                # List all products
-                products = Product.objects.all()
-                serializer = ProductSerializer(products, many=True)
-                response = Response(serializer.data)
+                return self.get_product(request, product_id)
+
+            try:
+                queryset = filter_products(Product.objects.all(), request.query_params)
+            except ProductFilterError as e:
+                return Response({"message": "Invalid product filter", "error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            stream_format = request.query_params.get('stream')
+            if stream_format:
+                return self.stream_products(request, stream_format, queryset)
+
+            # List products one keyset page at a time
+            paginator = ProductCursorPagination()
+            products = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = ProductSerializer(products, many=True, context={'request': request})
+            response = paginator.get_paginated_response(serializer.data)
             
             # Add cache control headers
             response["Cache-Control"] = "no-cache, no-store, must-revalidate"
@@ -515,6 +444,61 @@ class ProductAPI(APIView):
         except Exception as e:
             return Response({"message": "Error fetching products", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def get_product(self, request, product_id):
+        """
+        One product, served from `product_cache` when possible.
+
+        `?language_id=` keeps only that language's description and
+        `?store_id=` answers 404 for products not assigned to the store.
+        Responses carry an ETag and Last-Modified (the product's
+        date_modified) and conditional requests get 304.
+        """
+        try:
+            language_id = request.query_params.get('language_id')
+            language_id = int(language_id) if language_id else None
+            store_id = request.query_params.get('store_id')
+            store_id = int(store_id) if store_id else None
+        except ValueError:
+            return Response({"message": "language_id and store_id must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        variant = product_variant(request)
+        version = product_cache.version(product_id)
+        entry = product_cache.get(product_id, version, variant)
+        if entry is None:
+            queryset = Product.objects.all()
+            if store_id is not None and table_exists('oc_product_to_store'):
+                # Checked in the same SELECT as the product itself
+                queryset = queryset.filter(
+                    product_id__in=ProductToStore.objects.filter(store_id=store_id).values('product_id')
+                )
+            product = queryset.get(product_id=product_id)
+            data = ProductSerializer(product, context={'request': request}).data
+            if language_id is not None and 'descriptions' in data:
+                data['descriptions'] = [d for d in data['descriptions'] if d['language_id'] == language_id]
+            entry = product_cache.set(product_id, version, variant, data, product.date_modified)
+
+        response = Response(entry.data)
+        response['ETag'] = entry.etag
+        last_modified = entry.last_modified.timestamp() if entry.last_modified else None
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'no-cache'
+        return get_conditional_response(request, etag=entry.etag, last_modified=last_modified, response=response)
+
+    def stream_products(self, request, stream_format, queryset):
+        if stream_format not in STREAM_FORMATS:
+            return Response({
+                "message": "Invalid stream format",
+                "error": f"stream must be one of: {', '.join(STREAM_FORMATS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        chunks = iter_keyset_chunks(queryset, 'product_id')
+        return streaming_response(
+            stream_format,
+            chunks,
+            lambda products: ProductSerializer(products, many=True, context={'request': request}).data
+        )
+
     def post(self, request):
         try:
             with transaction.atomic():
@@ -525,16 +509,16 @@ class ProductAPI(APIView):
                     with connection.cursor() as cursor:
                         # Check which tables exist
                         tables = {
-                            'product': self.table_exists(cursor, 'oc_product'),
-                            'product_description': self.table_exists(cursor, 'oc_product_description'),
-                            'product_to_category': self.table_exists(cursor, 'oc_product_to_category'),
-                            'product_image': self.table_exists(cursor, 'oc_product_image'),
-                            'product_special': self.table_exists(cursor, 'oc_product_special'),
-                            'product_discount': self.table_exists(cursor, 'oc_product_discount'),
-                            'product_attribute': self.table_exists(cursor, 'oc_product_attribute'),
-                            'product_option': self.table_exists(cursor, 'oc_product_option'),
-                            'product_option_value': self.table_exists(cursor, 'oc_product_option_value'),
-                            'product_to_store': self.table_exists(cursor, 'oc_product_to_store')
+                            'product': table_exists('oc_product'),
+                            'product_description': table_exists('oc_product_description'),
+                            'product_to_category': table_exists('oc_product_to_category'),
+                            'product_image': table_exists('oc_product_image'),
+                            'product_special': table_exists('oc_product_special'),
+                            'product_discount': table_exists('oc_product_discount'),
+                            'product_attribute': table_exists('oc_product_attribute'),
+                            'product_option': table_exists('oc_product_option'),
+                            'product_option_value': table_exists('oc_product_option_value'),
+                            'product_to_store': table_exists('oc_product_to_store')
                         }
                         
                         logger.info(f"Available tables: {tables}")
@@ -584,28 +568,12 @@ class ProductAPI(APIView):
                         cursor.execute(insert_query, params)
                         
                         # Get the product ID
-                        cursor.execute("SELECT LAST_INSERT_ID()")
-                        product_id = cursor.fetchone()[0]
+                        product_id = cursor.lastrowid
                         logger.info(f"Created product with ID: {product_id}")
 
                         # 2. Insert product descriptions
                         if tables['product_description'] and 'descriptions' in request.data:
-                            for desc in request.data['descriptions']:
-                                cursor.execute("""
-                                    INSERT INTO oc_product_description 
-                                    (product_id, language_id, name, description, tag, meta_title, 
-                                    meta_description, meta_keyword)
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                                """, [
-                                    product_id,
-                                    desc.get('language_id', 1),
-                                    desc.get('name', ''),
-                                    desc.get('description', ''),
-                                    desc.get('tag', ''),
-                                    desc.get('meta_title', ''),
-                                    desc.get('meta_description', ''),
-                                    desc.get('meta_keyword', '')
-                                ])
+                            write_descriptions(cursor, PRODUCT_DESCRIPTIONS, [(product_id, request.data['descriptions'])])
 
                         # 3. Insert product categories and ensure proper category paths
                         if tables['product_to_category']:
@@ -615,26 +583,13 @@ class ProductAPI(APIView):
                                 # If no categories specified, add to a default category (usually 1)
                                 categories = [{'category_id': 1}]
                             
-                            for category in categories:
+                            # Also add to parent categories
+                            category_ids = category_index.expand(c['category_id'] for c in categories)
+                            for category_id in category_ids:
                                 cursor.execute("""
                                     INSERT INTO oc_product_to_category (product_id, category_id)
                                     VALUES (%s, %s)
-                                """, [product_id, category['category_id']])
-                                
-                                # Also add to parent categories
-                                cursor.execute("""
-                                    SELECT path_id 
-                                    FROM oc_category_path 
-                                    WHERE category_id = %s
-                                """, [category['category_id']])
-                                parent_paths = cursor.fetchall()
-                                
-                                for path in parent_paths:
-                                    if path[0] != category['category_id']:  # Don't duplicate the main category
-                                        cursor.execute("""
-                                            INSERT INTO oc_product_to_category (product_id, category_id)
-                                            VALUES (%s, %s)
-                                        """, [product_id, path[0]])
+                                """, [product_id, category_id])
 
                         # 4. Insert product images
                         if tables['product_image'] and 'images' in request.data:
@@ -677,8 +632,8 @@ class ProductAPI(APIView):
                                     VALUES (%s, %s)
                                 """, [product_id, store[0]])
 
-                        # Clear the cache after all updates
-                        self.clear_opencart_cache()
+                        # Clear the cache once the transaction commits
+                        invalidate_cache_tags(*PRODUCT_WRITE_TAGS)
                         
                         # Return the created product
                         product = Product.objects.get(product_id=product_id)
@@ -691,205 +646,86 @@ class ProductAPI(APIView):
             logger.error(f"Error creating product: {str(e)}")
             return Response({"message": "Error creating product", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def table_exists(self, cursor, table_name):
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM information_schema.tables 
-            WHERE table_schema = DATABASE()
-            AND table_name = %s
-        """, [table_name])
-        return cursor.fetchone()[0] > 0
+    def desired_children(self, validated_data, partial):
+        """Child rows the product should end up with, for each relation supplied."""
+        children = {}
+        if 'descriptions' in validated_data:
+            children['descriptions'] = [{
+                'language_id': desc.get('language_id', 1),
+                'name': desc.get('name', ''),
+                'description': desc.get('description', ''),
+                'tag': desc.get('tag', ''),
+                'meta_title': desc.get('meta_title', ''),
+                'meta_description': desc.get('meta_description', ''),
+                'meta_keyword': desc.get('meta_keyword', '')
+            } for desc in validated_data['descriptions']]
 
-    def put(self, request, product_id):
+        if 'categories' in validated_data:
+            # Also add to parent categories
+            category_ids = category_index.expand(c['category_id'] for c in validated_data['categories'])
+            children['categories'] = [{'category_id': category_id} for category_id in category_ids]
+
+        if 'images' in validated_data:
+            children['images'] = [
+                {'image': image.get('image', ''), 'sort_order': image.get('sort_order', idx)}
+                for idx, image in enumerate(validated_data['images'])
+            ]
+
+        if 'specials' in validated_data:
+            children['specials'] = [{
+                'customer_group_id': special.get('customer_group_id', 1),
+                'priority': special.get('priority', 0),
+                'price': special.get('price', 0),
+                'date_start': special.get('date_start'),
+                'date_end': special.get('date_end')
+            } for special in validated_data['specials']]
+
+        # A full update also keeps the product assigned to every store
+        if not partial:
+            children['stores'] = [{'store_id': store_id} for store_id in get_store_ids()]
+        return children
+
+    def update_product(self, request, product_id, partial):
         try:
             with transaction.atomic():
                 product = Product.objects.get(product_id=product_id)
-                serializer = ProductSerializer(product, data=request.data)
+                serializer = ProductSerializer(product, data=request.data, partial=partial)
                 if serializer.is_valid():
                     logger.info(f"Updating product {product_id} with data: {request.data}")
-                    
-                    with connection.cursor() as cursor:
-                        # Check which tables exist
-                        tables = {
-                            'product': self.table_exists(cursor, 'oc_product'),
-                            'product_description': self.table_exists(cursor, 'oc_product_description'),
-                            'product_to_category': self.table_exists(cursor, 'oc_product_to_category'),
-                            'product_image': self.table_exists(cursor, 'oc_product_image'),
-                            'product_special': self.table_exists(cursor, 'oc_product_special'),
-                            'product_discount': self.table_exists(cursor, 'oc_product_discount'),
-                            'product_attribute': self.table_exists(cursor, 'oc_product_attribute'),
-                            'product_option': self.table_exists(cursor, 'oc_product_option'),
-                            'product_option_value': self.table_exists(cursor, 'oc_product_option_value'),
-                            'product_to_store': self.table_exists(cursor, 'oc_product_to_store')
-                        }
-                        
-                        logger.info(f"Available tables: {tables}")
+                    validated_data = serializer.validated_data
 
-                        # 1. Update main product table
-                        if tables['product']:
-                            update_query = """
-                                UPDATE oc_product 
-                                SET model = %s,
-                                    sku = %s,
-                                    upc = %s,
-                                    ean = %s,
-                                    jan = %s,
-                                    isbn = %s,
-                                    mpn = %s,
-                                    location = %s,
-                                    quantity = %s,
-                                    stock_status_id = %s,
-                                    image = %s,
-                                    manufacturer_id = %s,
-                                    shipping = %s,
-                                    price = %s,
-                                    points = %s,
-                                    tax_class_id = %s,
-                                    date_available = %s,
-                                    weight = %s,
-                                    weight_class_id = %s,
-                                    length = %s,
-                                    width = %s,
-                                    height = %s,
-                                    length_class_id = %s,
-                                    subtract = %s,
-                                    minimum = %s,
-                                    sort_order = %s,
-                                    status = %s,
-                                    date_modified = NOW()
-                                WHERE product_id = %s
-                            """
-                            params = [
-                                serializer.validated_data.get('model', product.model),
-                                serializer.validated_data.get('sku', product.sku),
-                                serializer.validated_data.get('upc', product.upc),
-                                serializer.validated_data.get('ean', product.ean),
-                                serializer.validated_data.get('jan', product.jan),
-                                serializer.validated_data.get('isbn', product.isbn),
-                                serializer.validated_data.get('mpn', product.mpn),
-                                serializer.validated_data.get('location', product.location),
-                                serializer.validated_data.get('quantity', product.quantity),
-                                serializer.validated_data.get('stock_status_id', product.stock_status_id),
-                                serializer.validated_data.get('image', product.image),
-                                serializer.validated_data.get('manufacturer_id', product.manufacturer_id),
-                                serializer.validated_data.get('shipping', product.shipping),
-                                serializer.validated_data.get('price', product.price),
-                                serializer.validated_data.get('points', product.points),
-                                serializer.validated_data.get('tax_class_id', product.tax_class_id),
-                                serializer.validated_data.get('date_available', product.date_available),
-                                serializer.validated_data.get('weight', product.weight),
-                                serializer.validated_data.get('weight_class_id', product.weight_class_id),
-                                serializer.validated_data.get('length', product.length),
-                                serializer.validated_data.get('width', product.width),
-                                serializer.validated_data.get('height', product.height),
-                                serializer.validated_data.get('length_class_id', product.length_class_id),
-                                serializer.validated_data.get('subtract', product.subtract),
-                                serializer.validated_data.get('minimum', product.minimum),
-                                serializer.validated_data.get('sort_order', product.sort_order),
-                                serializer.validated_data.get('status', product.status),
-                                product_id
-                            ]
-                            cursor.execute(update_query, params)
-                        
-                        # 2. Update product descriptions
-                        if tables['product_description'] and 'descriptions' in request.data:
-                            cursor.execute("DELETE FROM oc_product_description WHERE product_id = %s", [product_id])
-                            for desc in request.data['descriptions']:
-                                cursor.execute("""
-                                    INSERT INTO oc_product_description 
-                                    (product_id, language_id, name, description, tag, meta_title, 
-                                    meta_description, meta_keyword)
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                                """, [
-                                    product_id,
-                                    desc.get('language_id', 1),
-                                    desc.get('name', ''),
-                                    desc.get('description', ''),
-                                    desc.get('tag', ''),
-                                    desc.get('meta_title', ''),
-                                    desc.get('meta_description', ''),
-                                    desc.get('meta_keyword', '')
-                                ])
-
-                        # 3. Update product categories and ensure proper category paths
-                        if tables['product_to_category'] and 'categories' in request.data:
-                            cursor.execute("DELETE FROM oc_product_to_category WHERE product_id = %s", [product_id])
-                            for category in request.data['categories']:
-                                cursor.execute("""
-                                    INSERT INTO oc_product_to_category (product_id, category_id)
-                                    VALUES (%s, %s)
-                                """, [product_id, category['category_id']])
-                                
-                                # Also add to parent categories
-                                cursor.execute("""
-                                    SELECT path_id 
-                                    FROM oc_category_path 
-                                    WHERE category_id = %s
-                                """, [category['category_id']])
-                                parent_paths = cursor.fetchall()
-                                
-                                for path in parent_paths:
-                                    if path[0] != category['category_id']:  # Don't duplicate the main category
-                                        cursor.execute("""
-                                            INSERT INTO oc_product_to_category (product_id, category_id)
-                                            VALUES (%s, %s)
-                                        """, [product_id, path[0]])
-
-                        # 4. Update product images
-                        if tables['product_image'] and 'images' in request.data:
-                            cursor.execute("DELETE FROM oc_product_image WHERE product_id = %s", [product_id])
-                            for idx, image in enumerate(request.data['images']):
-                                cursor.execute("""
-                                    INSERT INTO oc_product_image (product_id, image, sort_order)
-                                    VALUES (%s, %s, %s)
-                                """, [product_id, image['image'], image.get('sort_order', idx)])
+                    with connection.cursor() as cursor:
+                        # 1. Reconcile child tables, writing only rows that differ
+                        changes = {}
+                        for name, rows in self.desired_children(validated_data, partial).items():
+                            spec = PRODUCT_CHILD_TABLES[name]
+                            if table_exists(spec.table):
+                                changes[name] = reconcile_children(cursor, spec, 'product_id', product_id, rows)
+                        logger.info(f"Child rows reconciled for product {product_id}: {changes}")
 
-                        # 5. Update product special prices
-                        if tables['product_special'] and 'specials' in request.data:
-                            cursor.execute("DELETE FROM oc_product_special WHERE product_id = %s", [product_id])
-                            for special in request.data['specials']:
-                                cursor.execute("""
-                                    INSERT INTO oc_product_special 
-                                    (product_id, customer_group_id, priority, price, date_start, date_end)
-                                    VALUES (%s, %s, %s, %s, %s, %s)
-                                """, [
-                                    product_id,
-                                    special.get('customer_group_id', 1),
-                                    special.get('priority', 0),
-                                    special.get('price', 0),
-                                    special.get('date_start'),
-                                    special.get('date_end')
-                                ])
+                        # 2. Update the product columns whose values changed
+                        changed_columns = {
+                            column: value for column, value in validated_data.items()
+                            if column not in PRODUCT_CHILD_TABLES and getattr(product, column) != value
+                        }
+                        children_changed = any(sum(counts.values()) for counts in changes.values())
+                        if changed_columns or children_changed:
+                            assignments = ''.join(f"`{column}` = %s, " for column in changed_columns)
+                            cursor.execute(
+                                f"UPDATE oc_product SET {assignments}date_modified = NOW() WHERE product_id = %s",
+                                list(changed_columns.values()) + [product_id]
+                            )
 
-                        # 6. Update product store assignments - This is crucial for admin visibility
-                        if tables['product_to_store']:
-                            # Get all store IDs including admin store
-                            cursor.execute("SELECT store_id FROM oc_store")
-                            stores = cursor.fetchall()
-                            
-                            # If no stores found, add to store 0 (default store)
-                            if not stores:
-                                stores = [(0,)]
-                            
-                            # Delete existing store assignments
-                            cursor.execute("DELETE FROM oc_product_to_store WHERE product_id = %s", [product_id])
-                            
-                            # Add product to all stores including admin store
-                            for store in stores:
-                                cursor.execute("""
-                                    INSERT INTO oc_product_to_store (product_id, store_id)
-                                    VALUES (%s, %s)
-                                """, [product_id, store[0]])
+                            # Clear the caches once the transaction commits
+                            invalidate_cache_tags(*PRODUCT_WRITE_TAGS)
+                            invalidate_products([product_id])
 
-                        # Clear the cache after all updates
-                        self.clear_opencart_cache()
-                        
                         # Refresh the product instance
                         product.refresh_from_db()
-                        
+
                         # Log successful update
-                        logger.info(f"Successfully updated product {product_id} and all related tables")
-                        
+                        logger.info(f"Successfully updated product {product_id}, changed columns: {list(changed_columns)}")
+
                     return Response(serializer.data)
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Product.DoesNotExist:
@@ -898,6 +734,12 @@ class ProductAPI(APIView):
             logger.error(f"Error updating product: {str(e)}")
             return Response({"message": "Error updating product", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def put(self, request, product_id):
+        return self.update_product(request, product_id, partial=False)
+
+    def patch(self, request, product_id):
+        return self.update_product(request, product_id, partial=True)
+
     def delete(self, request, product_id):
         try:
             with transaction.atomic():
@@ -913,57 +755,26 @@ class ProductAPI(APIView):
                     
                     # Check which tables exist
                     tables = {
-                        'product': self.table_exists(cursor, 'oc_product'),
-                        'product_description': self.table_exists(cursor, 'oc_product_description'),
-                        'product_to_category': self.table_exists(cursor, 'oc_product_to_category'),
-                        'product_image': self.table_exists(cursor, 'oc_product_image'),
-                        'product_special': self.table_exists(cursor, 'oc_product_special'),
-                        'product_discount': self.table_exists(cursor, 'oc_product_discount'),
-                        'product_attribute': self.table_exists(cursor, 'oc_product_attribute'),
-                        'product_option': self.table_exists(cursor, 'oc_product_option'),
-                        'product_option_value': self.table_exists(cursor, 'oc_product_option_value'),
-                        'product_to_store': self.table_exists(cursor, 'oc_product_to_store'),
-                        'cache': self.table_exists(cursor, 'oc_cache'),
-                        'modification': self.table_exists(cursor, 'oc_modification'),
-                        'setting': self.table_exists(cursor, 'oc_setting'),
-                        'product_related': self.table_exists(cursor, 'oc_product_related'),
-                        'product_reward': self.table_exists(cursor, 'oc_product_reward'),
-                        'product_to_layout': self.table_exists(cursor, 'oc_product_to_layout'),
-                        'product_recurring': self.table_exists(cursor, 'oc_product_recurring'),
-                        'product_filter': self.table_exists(cursor, 'oc_product_filter'),
-                        'product_download': self.table_exists(cursor, 'oc_product_download')
+                        'product': table_exists('oc_product'),
+                        'product_description': table_exists('oc_product_description'),
+                        'product_to_category': table_exists('oc_product_to_category'),
+                        'product_image': table_exists('oc_product_image'),
+                        'product_special': table_exists('oc_product_special'),
+                        'product_discount': table_exists('oc_product_discount'),
+                        'product_attribute': table_exists('oc_product_attribute'),
+                        'product_option': table_exists('oc_product_option'),
+                        'product_option_value': table_exists('oc_product_option_value'),
+                        'product_to_store': table_exists('oc_product_to_store'),
+                        'product_related': table_exists('oc_product_related'),
+                        'product_reward': table_exists('oc_product_reward'),
+                        'product_to_layout': table_exists('oc_product_to_layout'),
+                        'product_recurring': table_exists('oc_product_recurring'),
+                        'product_filter': table_exists('oc_product_filter'),
+                        'product_download': table_exists('oc_product_download')
                     }
                     
                     logger.info(f"Available tables for deletion: {tables}")
                     
-                    # First, clear all caches before deletion
-                    if tables['cache']:
-                        logger.info("Clearing cache tables")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'product%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'category%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'manufacturer%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'store%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'admin%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'menu%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'information%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'layout%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'theme%'")
-                        cursor.execute("DELETE FROM oc_cache WHERE `key` LIKE 'template%'")
-                    
-                    if tables['modification']:
-                        logger.info("Clearing modification cache")
-                        cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'product%'")
-                        cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'category%'")
-                        cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'store%'")
-                        cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'admin%'")
-                        cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'menu%'")
-                        cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'layout%'")
-                        cursor.execute("DELETE FROM oc_modification WHERE code LIKE 'theme%'")
-                    
-                    if tables['setting']:
-                        logger.info("Updating modification timestamp")
-                        cursor.execute("UPDATE oc_setting SET value = NOW() WHERE `key` = 'config_modification'")
-                    
                     # Delete from all related tables in the correct order
                     if tables['product_related']:
                         logger.info("Deleting from product_related")
@@ -1030,41 +841,6 @@ class ProductAPI(APIView):
                         logger.info("Deleting from product table")
                         cursor.execute("DELETE FROM oc_product WHERE product_id = %s", [product_id])
                     
-                    # Clear all cache directories
-                    cache_dirs = [
-                        'system/storage/cache/',
-                        'system/storage/modification/',
-                        'image/cache/',
-                        'admin/storage/cache/',
-                        'admin/storage/modification/',
-                        'catalog/view/theme/default/template/product/',
-                        'catalog/view/theme/default/template/category/',
-                        'catalog/view/theme/default/template/common/',
-                        'catalog/view/theme/default/template/checkout/',
-                        'catalog/view/theme/default/template/account/',
-                        'catalog/view/theme/default/template/error/',
-                        'catalog/view/theme/default/template/information/',
-                        'catalog/view/theme/default/template/module/',
-                        'catalog/view/theme/default/template/payment/',
-                        'catalog/view/theme/default/template/shipping/',
-                        'catalog/view/theme/default/template/total/'
-                    ]
-                    
-                    for cache_dir in cache_dirs:
-                        try:
-                            if os.path.exists(cache_dir):
-                                logger.info(f"Clearing cache directory: {cache_dir}")
-                                for file in os.listdir(cache_dir):
-                                    file_path = os.path.join(cache_dir, file)
-                                    try:
-                                        if os.path.isfile(file_path):
-                                            os.unlink(file_path)
-                                    except Exception as e:
-                                        logger.warning(f"Error clearing cache file {file_path}: {str(e)}")
-                        except Exception as e:
-                            logger.warning(f"Error accessing cache directory {cache_dir}: {str(e)}")
-                            continue
-                    
                     # Verify deletion in all tables
                     verification_tables = [
                         'oc_product', 'oc_product_description', 'oc_product_to_category',
@@ -1075,17 +851,20 @@ class ProductAPI(APIView):
                         'oc_product_download'
                     ]
                     
-                    for table in verification_tables:
-                        if self.table_exists(cursor, table):
-                            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE product_id = %s", [product_id])
-                            count = cursor.fetchone()[0]
-                            if count > 0:
-                                logger.error(f"Product {product_id} still has {count} entries in {table}")
-                                raise Exception(f"Product deletion verification failed in {table}")
+                    def product_rows_remaining():
+                        # One round-trip for every table instead of one per table
+                        counts = [
+                            f"(SELECT COUNT(*) FROM {table} WHERE product_id = %s)"
+                            for table in verification_tables if table_exists(table)
+                        ]
+                        cursor.execute(f"SELECT {' + '.join(counts)}", [product_id] * len(counts))
+                        return cursor.fetchone()[0]
+
+                    verify(f"product {product_id} deleted", lambda: product_rows_remaining() == 0)
                     
-                    # Force refresh of modification cache
-                    if tables['setting']:
-                        cursor.execute("UPDATE oc_setting SET value = NOW() WHERE `key` = 'config_modification'")
+                    # Clear all caches once the deletion commits
+                    invalidate_cache_tags(*PRODUCT_DELETE_TAGS)
+                    invalidate_products([product_id])
                     
                     logger.info(f"Successfully deleted product {product_id} and all related data")
                     return Response({"message": "Product deleted successfully"})
@@ -1094,10 +873,254 @@ class ProductAPI(APIView):
             logger.error(f"Error deleting product: {str(e)}")
             return Response({"message": "Error deleting product", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ProductBulkAPI(APIView):
+    authentication_classes = [ApiKeyAuthentication]
+    permission_classes = [AllowAny]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    # oc_product columns and the defaults used when a field is not supplied
+    PRODUCT_DEFAULTS = [
+        ('model', ''), ('sku', ''), ('upc', ''), ('ean', ''), ('jan', ''),
+        ('isbn', ''), ('mpn', ''), ('location', ''), ('quantity', 0),
+        ('stock_status_id', 7), ('image', ''), ('manufacturer_id', 1),
+        ('shipping', True), ('price', 0.0000), ('points', 0), ('tax_class_id', 9),
+        ('date_available', None), ('weight', 0.00000000), ('weight_class_id', 1),
+        ('length', 0.00000000), ('width', 0.00000000), ('height', 0.00000000),
+        ('length_class_id', 1), ('subtract', True), ('minimum', 1),
+        ('sort_order', 0), ('status', True)
+    ]
+    SPECIAL_COLUMNS = ['product_id', 'customer_group_id', 'priority', 'price', 'date_start', 'date_end']
+
+    def write_chunk(self, cursor, chunk, store_ids, chunk_size):
+        """
+        Insert a chunk of validated products, one multi-row INSERT per table.
+
+        The oc_product rows go first so their AUTO_INCREMENT ids can be
+        used by the rows hanging off them.
+        """
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        today = timezone.now().date()
+
+        product_rows = []
+        for _, data in chunk:
+            row = []
+            for column, default in self.PRODUCT_DEFAULTS:
+                if column == 'date_available':
+                    default = today
+                row.append(data.get(column, default))
+            product_rows.append(row + [now, now])
+        product_columns = [c for c, _ in self.PRODUCT_DEFAULTS] + ['date_added', 'date_modified']
+        product_ids = insert_returning_ids(cursor, 'oc_product', product_columns, product_rows, chunk_size)
+
+        descriptions, category_rows = [], []
+        image_rows, special_rows, store_rows = [], [], []
+        for product_id, (_, data) in zip(product_ids, chunk):
+            descriptions.append((product_id, data.get('descriptions', [])))
+
+            # Assigned categories plus their parent categories
+            category_ids = category_index.expand(
+                category['category_id'] for category in data.get('categories') or [{'category_id': 1}]
+            )
+            category_rows.extend([product_id, category_id] for category_id in category_ids)
+
+            for idx, image in enumerate(data.get('images', [])):
+                image_rows.append([product_id, image.get('image', ''), image.get('sort_order', idx)])
+
+            for special in data.get('specials', []):
+                special_rows.append([
+                    product_id,
+                    special.get('customer_group_id', 1),
+                    special.get('priority', 0),
+                    special.get('price', 0),
+                    special.get('date_start'),
+                    special.get('date_end')
+                ])
+
+            store_rows.extend([product_id, store_id] for store_id in store_ids)
+
+        if table_exists('oc_product_description'):
+            write_descriptions(cursor, PRODUCT_DESCRIPTIONS, descriptions, chunk_size=chunk_size)
+        if table_exists('oc_product_to_category'):
+            insert_rows(cursor, 'oc_product_to_category', ['product_id', 'category_id'], category_rows, chunk_size)
+        if table_exists('oc_product_image'):
+            insert_rows(cursor, 'oc_product_image', ['product_id', 'image', 'sort_order'], image_rows, chunk_size)
+        if table_exists('oc_product_special'):
+            insert_rows(cursor, 'oc_product_special', self.SPECIAL_COLUMNS, special_rows, chunk_size)
+        if table_exists('oc_product_to_store'):
+            insert_rows(cursor, 'oc_product_to_store', ['product_id', 'store_id'], store_rows, chunk_size)
+        return product_ids
+
+    def import_chunk(self, chunk, store_ids, chunk_size):
+        """
+        Write one chunk in its own transaction. Returns (created, errors).
+
+        If the chunk fails as a whole, its rows are retried one by one so
+        only the offending rows are reported.
+        """
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    product_ids = self.write_chunk(cursor, chunk, store_ids, chunk_size)
+                invalidate_cache_tags(*PRODUCT_WRITE_TAGS)
+            return [
+                {'index': index, 'product_id': product_id}
+                for (index, _), product_id in zip(chunk, product_ids)
+            ], []
+        except Exception as e:
+            if len(chunk) == 1:
+                logger.error(f"Error importing product at index {chunk[0][0]}: {str(e)}")
+                return [], [{'index': chunk[0][0], 'errors': {'non_field_errors': [str(e)]}}]
+
+        logger.warning(f"Bulk chunk of {len(chunk)} products failed, retrying row by row")
+        created, errors = [], []
+        for item in chunk:
+            item_created, item_errors = self.import_chunk([item], store_ids, chunk_size)
+            created.extend(item_created)
+            errors.extend(item_errors)
+        return created, errors
+
+    def post(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({
+                "message": "Error importing products",
+                "error": "Expected a JSON array or an NDJSON stream of products"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', get_bulk_chunk_size()))
+            if chunk_size < 1:
+                raise ValueError
+        except ValueError:
+            return Response({
+                "message": "Error importing products",
+                "error": "chunk_size must be a positive integer"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            logger.info(f"Bulk importing {len(rows)} products in chunks of {chunk_size}")
+
+            # Validate every row up front, keeping the valid ones
+            validator = ProductSerializer(many=True).child
+            valid, errors = [], []
+            for index, row in enumerate(rows):
+                try:
+                    valid.append((index, validator.run_validation(row)))
+                except serializers.ValidationError as e:
+                    errors.append({'index': index, 'errors': e.detail})
+
+            created = []
+            store_ids = get_store_ids()
+            for chunk in chunked(valid, chunk_size):
+                chunk_created, chunk_errors = self.import_chunk(chunk, store_ids, chunk_size)
+                created.extend(chunk_created)
+                errors.extend(chunk_errors)
+
+            errors.sort(key=lambda error: error['index'])
+            logger.info(f"Bulk import finished: {len(created)} created, {len(errors)} failed")
+            return Response({
+                "message": "Products imported" if not errors else "Products imported with errors",
+                "created_count": len(created),
+                "error_count": len(errors),
+                "created": created,
+                "errors": errors
+            }, status=status.HTTP_201_CREATED if not errors else status.HTTP_207_MULTI_STATUS)
+        except Exception as e:
+            logger.error(f"Error importing products: {str(e)}")
+            return Response({"message": "Error importing products", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ProductStockAPI(APIView):
+    authentication_classes = [ApiKeyAuthentication]
+    permission_classes = [AllowAny]
+
+    STOCK_FIELDS = ['quantity', 'price', 'status']
+
+    def apply_chunk(self, cursor, updates):
+        """
+        Apply {product_id: fields} with one UPDATE ... CASE statement.
+
+        Returns the ids that exist in oc_product.
+        """
+        product_ids = list(updates)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        cursor.execute(f"SELECT product_id FROM oc_product WHERE product_id IN ({placeholders})", product_ids)
+        found = [row[0] for row in cursor.fetchall()]
+        if not found:
+            return found
+
+        assignments, params = [], []
+        for field in self.STOCK_FIELDS:
+            cases = [(product_id, updates[product_id][field]) for product_id in found if field in updates[product_id]]
+            if not cases:
+                continue
+            assignments.append(f"{field} = CASE product_id {' '.join(['WHEN %s THEN %s'] * len(cases))} ELSE {field} END")
+            for product_id, value in cases:
+                params.extend([product_id, value])
+
+        found_placeholders = ', '.join(['%s'] * len(found))
+        cursor.execute(f"""
+            UPDATE oc_product
+            SET {', '.join(assignments)}, date_modified = NOW()
+            WHERE product_id IN ({found_placeholders})
+        """, params + found)
+        return found
+
+    def patch(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({
+                "message": "Error updating stock",
+                "error": "Expected a list of {product_id, quantity, price, status} objects"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = []
+            updates = {}
+            for index, item in enumerate(items):
+                serializer = ProductStockSerializer(data=item)
+                if serializer.is_valid():
+                    data = dict(serializer.validated_data)
+                    # Later entries for the same product win
+                    updates.setdefault(data.pop('product_id'), {}).update(data)
+                else:
+                    product_id = item.get('product_id') if isinstance(item, dict) else None
+                    results.append({
+                        'index': index, 'product_id': product_id,
+                        'status': 'invalid', 'errors': serializer.errors
+                    })
+
+            updated = 0
+            for chunk in chunked(list(updates.items()), get_bulk_chunk_size()):
+                chunk_updates = dict(chunk)
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        found = set(self.apply_chunk(cursor, chunk_updates))
+                    if found:
+                        # Only product-level caches depend on stock and price
+                        invalidate_cache_tags('product')
+                        invalidate_products(found)
+                results.extend({
+                    'product_id': product_id,
+                    'status': 'updated' if product_id in found else 'not_found'
+                } for product_id in chunk_updates)
+                updated += len(found)
+
+            failed = len(results) - updated
+            logger.info(f"Stock update applied to {updated} products, {failed} failed")
+            return Response({
+                "message": "Stock updated" if not failed else "Stock updated with errors",
+                "updated_count": updated,
+                "results": results
+            }, status=status.HTTP_200_OK if not failed else status.HTTP_207_MULTI_STATUS)
+        except Exception as e:
+            logger.error(f"Error updating stock: {str(e)}")
+            return Response({"message": "Error updating stock", "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [AllowAny]
+    query_budget = {'list': 2, 'retrieve': 2, 'addresses': 2, 'search': 2}
 
     def update(self, request, *args, **kwargs):
         try:
@@ -1140,32 +1163,28 @@ class CustomerViewSet(viewsets.ModelViewSet):
                     if rows_affected == 0:
                         raise serializers.ValidationError("No rows were updated")
                     
-                    # Verify the update
-                    cursor.execute("""
-                        SELECT customer_id, firstname, lastname, email, telephone, status
-                        FROM oc_customer 
-                        WHERE customer_id = %s
-                    """, [instance.customer_id])
-                    
-                    updated_data = cursor.fetchone()
-                    logger.info(f"Updated data in database: {updated_data}")
-                    
-                    if not updated_data:
-                        raise serializers.ValidationError("Failed to verify update")
-                    
-                    # Refresh the instance
-                    instance.refresh_from_db()
+                    invalidate_customer_tokens(instance.customer_id)
+
+                    # Apply the written values to the instance instead of re-reading them
+                    instance.firstname, instance.lastname, instance.email, instance.telephone = params[:4]
                     result = self.get_serializer(instance).data
-                    logger.info(f"Final serialized data: {result}")
-                    
+
                     # Verify the update was successful
-                    if (result['firstname'] != request.data.get('firstname', result['firstname']) or
-                        result['lastname'] != request.data.get('lastname', result['lastname']) or
-                        result['email'] != request.data.get('email', result['email']) or
-                        result['telephone'] != request.data.get('telephone', result['telephone'])):
-                        logger.error("Data mismatch after update!")
-                        logger.error(f"Expected: {request.data}")
-                        logger.error(f"Got: {result}")
+                    def matches_database():
+                        saved = Customer.objects.filter(customer_id=instance.customer_id).values(
+                            'firstname', 'lastname', 'email', 'telephone'
+                        ).first()
+                        return saved == {
+                            'firstname': result['firstname'],
+                            'lastname': result['lastname'],
+                            'email': result['email'],
+                            'telephone': result['telephone']
+                        }
+
+                    try:
+                        verify(f"customer {instance.customer_id} updated", matches_database)
+                    except VerificationError:
+                        logger.error(f"Data mismatch after update! Expected: {request.data}")
                         raise serializers.ValidationError("Update verification failed")
                     
                     return Response(result)
@@ -1183,11 +1202,74 @@ class CustomerViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', settings.OPENCART_CUSTOMER_SEARCH_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, 100))
+
+        serializer = self.get_serializer(search_customers(query, limit), many=True)
+        return Response(serializer.data)
+
+    EXPORT_COLUMNS = [
+        'customer_id', 'customer_group_id', 'store_id', 'language_id', 'firstname', 'lastname',
+        'email', 'telephone', 'newsletter', 'status', 'date_added'
+    ]
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        stream_format = request.query_params.get('stream', 'csv')
+        if stream_format not in EXPORT_FORMATS:
+            return Response({
+                "message": "Invalid export format",
+                "error": f"stream must be one of: {', '.join(EXPORT_FORMATS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Customer.objects.values(*self.EXPORT_COLUMNS)
+        updated_since = request.query_params.get('updated_since')
+        if updated_since:
+            since = parse_since(updated_since)
+            if since is None:
+                return Response(
+                    {"error": "updated_since must be an ISO 8601 date or datetime"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # oc_customer keeps no modification time, so new customers since
+            # the last export are what an incremental run can pick up
+            queryset = queryset.filter(date_added__gte=since)
+
+        chunks = iter_keyset_chunks(queryset, 'customer_id')
+        return streaming_response(
+            stream_format,
+            chunks,
+            self.export_rows,
+            filename=f"customers.{stream_format}",
+            columns=self.EXPORT_COLUMNS + ['addresses']
+        )
+
+    def export_rows(self, customers):
+        """Attach the addresses of one chunk of customers with a single query."""
+        table, columns, order_by = CUSTOMER_RELATIONS['addresses']
+        addresses = fetch_grouped(table, 'customer_id', columns, [c['customer_id'] for c in customers], order_by)
+        for customer in customers:
+            customer['addresses'] = addresses.get(customer['customer_id'], [])
+        return customers
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            invalidate_customer_tokens(instance.customer_id)
+            instance.delete()
+
     @action(detail=True, methods=['get'])
     def addresses(self, request, pk=None):
         customer = self.get_object()
-        addresses = Address.objects.filter(customer=customer)
-        serializer = AddressSerializer(addresses, many=True)
+        load_customer_relations([customer], ['addresses'])
+        serializer = AddressSerializer(customer.addresses, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
@@ -1195,29 +1277,64 @@ class CustomerViewSet(viewsets.ModelViewSet):
         customer = self.get_object()
         serializer = AddressSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(customer=customer)
+            serializer.save(customer_id=customer.customer_id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class AddressViewSet(viewsets.ModelViewSet):
     queryset = Address.objects.all()
     serializer_class = AddressSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsCustomer]
 
     def get_queryset(self):
-        return Address.objects.filter(customer_id=self.request.user.id)
+        return Address.objects.filter(customer_id=self.request.user.customer_id)
+
+    def perform_create(self, serializer):
+        serializer.save(customer_id=self.request.user.customer_id)
 
 class ArticleViewSet(viewsets.ModelViewSet):
     queryset = Article.objects.all()
     serializer_class = ArticleSerializer
     permission_classes = [AllowAny]
+    query_budget = {'list': 3, 'retrieve': 3, 'comments': 4, 'comment_replies': 5}
+
+    def paginated_comments(self, request, queryset):
+        """A cursor page of comments, each with a preview of its replies."""
+        try:
+            max_depth = request.query_params.get('max_depth')
+            replies_limit = request.query_params.get('replies_limit')
+            max_depth = int(max_depth) if max_depth is not None else None
+            if replies_limit is not None:
+                replies_limit = int(replies_limit)
+            else:
+                replies_limit = getattr(settings, 'OPENCART_COMMENT_PREVIEW_REPLIES', None)
+        except ValueError:
+            return Response(
+                {"error": "max_depth and replies_limit must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        paginator = CommentCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        tree = CommentTree.for_roots(page, max_depth=max_depth, per_level_limit=replies_limit)
+        serializer = ArticleCommentSerializer(
+            page, many=True, context={'request': request, 'comment_tree': tree}
+        )
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def comments(self, request, pk=None):
         article = self.get_object()
-        comments = ArticleComment.objects.filter(article=article, parent=None)
-        serializer = ArticleCommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        queryset = ArticleComment.objects.filter(article_id=article.article_id, parent__isnull=True)
+        return self.paginated_comments(request, queryset)
+
+    @action(detail=True, methods=['get'], url_path=r'comments/(?P<comment_id>\d+)/replies')
+    def comment_replies(self, request, pk=None, comment_id=None):
+        article = self.get_object()
+        parent = get_object_or_404(
+            ArticleComment, article_comment_id=comment_id, article_id=article.article_id
+        )
+        queryset = ArticleComment.objects.filter(parent_id=parent.article_comment_id)
+        return self.paginated_comments(request, queryset)
 
     @action(detail=True, methods=['post'])
     def add_comment(self, request, pk=None):
@@ -1229,13 +1346,16 @@ class ArticleViewSet(viewsets.ModelViewSet):
             # Add article to the request data
             comment_data = request.data.copy()
             
-            serializer = ArticleCommentSerializer(data=comment_data)
+            # A new comment has no replies to look up
+            serializer = ArticleCommentSerializer(data=comment_data, context={'comment_tree': CommentTree([])})
             if serializer.is_valid():
-                comment = serializer.save(
-                    article=article,
-                    status=1,  # Set default status
-                    date_added=timezone.now()
-                )
+                with transaction.atomic():
+                    comment = serializer.save(
+                        article=article,
+                        status=1,  # Set default status
+                        date_added=timezone.now()
+                    )
+                    record_reply(comment)
                 logger.info(f"Comment created successfully with ID: {comment.article_comment_id}")
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             
@@ -1253,34 +1373,63 @@ class ArticleViewSet(viewsets.ModelViewSet):
     def reply_to_comment(self, request, pk=None):
         article = self.get_object()
         parent_comment_id = request.data.get('parent_comment_id')
-        parent_comment = get_object_or_404(ArticleComment, article_comment_id=parent_comment_id)
+        parent_comment = get_object_or_404(
+            ArticleComment, article_comment_id=parent_comment_id, article_id=article.article_id
+        )
         
-        serializer = ArticleCommentSerializer(data=request.data)
+        serializer = ArticleCommentSerializer(data=request.data, context={'comment_tree': CommentTree([])})
         if serializer.is_valid():
-            serializer.save(article=article, parent=parent_comment)
+            with transaction.atomic():
+                comment = serializer.save(article=article, parent=parent_comment)
+                record_reply(comment)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class QueryMetricsAPI(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response(dict(
+            query_metrics.snapshot(),
+            api_history=api_history_recorder.stats(),
+            product_cache=product_cache.stats()
+        ))
+
+    def delete(self, request):
+        query_metrics.reset()
+        product_cache.reset_stats()
+        return Response({"message": "Query metrics reset"})
+
 class ApiViewSet(viewsets.ModelViewSet):
     queryset = Api.objects.all()
     serializer_class = ApiSerializer
-    permission_classes = [IsAuthenticated]
+    authentication_classes = [ApiKeyAuthentication]
+    # Lists every client's key; customer tokens must not reach it
+    permission_classes = [IsApiClient]
 
     @action(detail=True, methods=['post'])
     def add_ip(self, request, pk=None):
         api = self.get_object()
         serializer = ApiIpSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(api=api)
+            with transaction.atomic():
+                serializer.save(api=api)
+                invalidate_api_keys(api.api_id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
         api = self.get_object()
-        history = ApiHistory.objects.filter(api=api)
-        serializer = ApiHistorySerializer(history, many=True)
-        return Response(serializer.data)
+        paginator = ApiHistoryCursorPagination()
+        page = paginator.paginate_queryset(ApiHistory.objects.filter(api=api), request, view=self)
+        serializer = ApiHistorySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+            invalidate_api_keys(serializer.instance.api_id)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -1294,4 +1443,6 @@ class ApiViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         # Log API deletion
         logger.info(f"API deleted: {instance.username}")
-        instance.delete()
+        with transaction.atomic():
+            invalidate_api_keys(instance.api_id)
+            instance.delete()
@@ -0,0 +1,70 @@
+from django.conf import settings
+
+
+def get_bulk_chunk_size():
+    return getattr(settings, 'OPENCART_BULK_CHUNK_SIZE', 500)
+
+
+def chunked(items, size):
+    """Split `items` into lists of at most `size` elements."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_rows(cursor, table, columns, rows, chunk_size=None, update_columns=None):
+    """
+    Insert `rows` (sequences ordered like `columns`) into `table` in chunks.
+
+    Each chunk is sent with `executemany`, which the MySQL drivers rewrite
+    into a single multi-row INSERT. When `update_columns` is given the
+    statement becomes an upsert that overwrites those columns on duplicate
+    keys. Returns the number of rows sent.
+    """
+    if not rows:
+        return 0
+
+    placeholders = ', '.join(['%s'] * len(columns))
+    query = f"INSERT INTO {table} ({', '.join(f'`{c}`' for c in columns)}) VALUES ({placeholders})"
+    if update_columns:
+        query += " ON DUPLICATE KEY UPDATE " + ', '.join(f"`{c}` = VALUES(`{c}`)" for c in update_columns)
+
+    count = 0
+    for chunk in chunked(rows, chunk_size or get_bulk_chunk_size()):
+        cursor.executemany(query, chunk)
+        count += len(chunk)
+    return count
+
+
+def insert_returning_ids(cursor, table, columns, rows, chunk_size=None):
+    """
+    Insert `rows` into `table`, numbered by its AUTO_INCREMENT, and return
+    their ids in order.
+
+    Each chunk is sent as one multi-row INSERT (not `executemany`, which may
+    split it). InnoDB reserves the ids of such a statement as one block in
+    every `innodb_autoinc_lock_mode`, so they follow from LAST_INSERT_ID()
+    and `@@auto_increment_increment`. Ids are never reused and concurrent
+    inserts from OpenCart are not blocked.
+    """
+    if not rows:
+        return []
+
+    cursor.execute("SELECT @@auto_increment_increment")
+    step = cursor.fetchone()[0]
+    row_placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    ids = []
+    for chunk in chunked(rows, chunk_size or get_bulk_chunk_size()):
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(f'`{c}`' for c in columns)}) "
+            f"VALUES {', '.join([row_placeholders] * len(chunk))}",
+            [value for row in chunk for value in row]
+        )
+        first = cursor.lastrowid
+        ids.extend(range(first, first + step * len(chunk), step))
+    return ids
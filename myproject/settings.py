@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "myapp.middleware.QueryProfilerMiddleware",  # Per-request SQL counts and budgets
+    "myapp.middleware.ApiHistoryMiddleware",  # Batched oc_api_history logging
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # Add CORS middleware
     "django.middleware.common.CommonMiddleware",
@@ -91,6 +93,23 @@ DATABASES = {
     }
 }
 
+# Local memory by default. Production with several worker processes
+# requires a shared "default" backend (Redis, Memcached): the category index
+# and table registry generations live there, and with local memory other
+# workers never see a bump (the myapp.W001 check warns about this).
+# Product payloads get their own alias so they never cull the counters
+# (generations, login failures) kept in "default".
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "products": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "opencart-products",
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+}
+
 
 
 # Password validation
@@ -136,7 +155,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Add REST Framework settings
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'myapp.authentication.CustomerTokenAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [],
     'UNAUTHENTICATED_USER': None
 }
@@ -163,6 +184,80 @@ LOGGING = {
     },
 }
 
+# Number of rows fetched per query when streaming large listings
+OPENCART_STREAM_CHUNK_SIZE = 500
+
+# Per-request query profiling; views over their `query_budget` are logged
+# ('log') or fail with QueryBudgetExceeded ('raise')
+OPENCART_QUERY_PROFILER = True
+OPENCART_QUERY_BUDGET_ACTION = 'log'
+
+# Deepest reply level returned in comment threads (None for unlimited)
+OPENCART_COMMENT_MAX_DEPTH = 20
+
+# Reply levels and replies per comment previewed under each page of comments
+OPENCART_COMMENT_PREVIEW_DEPTH = 2
+OPENCART_COMMENT_PREVIEW_REPLIES = 3
+
+# Authentication cache: how many tokens each process remembers and for how
+# long (seconds) a revoked token may still be accepted by other processes
+OPENCART_TOKEN_CACHE_SIZE = 10000
+OPENCART_TOKEN_CACHE_TTL = 60
+
+# Password hashing runs in this many worker processes (0 hashes inline); up to
+# OPENCART_PASSWORD_QUEUE_DEPTH more requests may wait before getting a 429
+OPENCART_PASSWORD_WORKERS = 2
+OPENCART_PASSWORD_QUEUE_DEPTH = 8
+
+# Failed logins allowed per email and per IP within the window (seconds)
+# before further attempts are refused without checking the password
+OPENCART_LOGIN_FAILURE_LIMIT = 5
+OPENCART_LOGIN_IP_FAILURE_LIMIT = 20
+OPENCART_LOGIN_FAILURE_WINDOW = 300
+
+# Default number of results for /api/customers/search/ (at most 100)
+OPENCART_CUSTOMER_SEARCH_LIMIT = 20
+
+# Upper bound on how long a cached category tree snapshot is served; writes
+# through the API rebuild it immediately.
+OPENCART_CATEGORY_TREE_TTL = 3600
+
+# Age (seconds) after which each process reloads its category index even
+# without a generation bump, which a local-memory cache never shares
+OPENCART_CATEGORY_INDEX_MAX_AGE = 300
+
+# Alias in CACHES holding serialized product details, keyed per product
+# version; point it at a shared backend to share them between processes.
+# With a local-memory backend an invalidation (stock or price patches
+# included) only reaches the writing process: the others keep serving their
+# copy for up to OPENCART_PRODUCT_CACHE_TTL seconds (check myapp.W001).
+OPENCART_PRODUCT_CACHE = 'products'
+OPENCART_PRODUCT_CACHE_TTL = 300
+
+# oc_api_history logging of API-key requests: 'async' (batched by a
+# background thread), 'sync' (written after each response) or 'off'. At most
+# OPENCART_API_HISTORY_BUFFER calls are held; older ones are dropped beyond that.
+OPENCART_API_HISTORY = 'async'
+OPENCART_API_HISTORY_BUFFER = 10000
+OPENCART_API_HISTORY_BATCH = 500
+OPENCART_API_HISTORY_FLUSH_INTERVAL = 1.0
+
+# Read-back verification of writes: 'off', 'sampled' or 'always'
+OPENCART_VERIFICATION_MODE = 'sampled' if DEBUG else 'off'
+OPENCART_VERIFICATION_SAMPLE_RATE = 0.01
+
+# Default number of rows per multi-row INSERT for bulk imports
+OPENCART_BULK_CHUNK_SIZE = 500
+
+# How often (seconds) each process checks whether the cached table list
+# was invalidated by `manage.py refresh_table_registry`
+OPENCART_SCHEMA_RECHECK_SECONDS = 60
+
+# OpenCart cache purges run after commit on a background worker ('async'),
+# coalescing tags seen within the window (seconds), or inline ('sync')
+OPENCART_CACHE_INVALIDATION = 'async'
+OPENCART_CACHE_INVALIDATION_WINDOW = 2.0
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 CORS_ALLOW_CREDENTIALS = True